@@ -1,51 +1,55 @@
-import io
-import urllib.request
-import zipfile
-import fiona
-from shapely.geometry import shape, Point
-from datetime import datetime, timedelta
-import pytz
-from timezonefinder import TimezoneFinder
-
-# Function to download and extract WRS-2 shapefiles
-def download_wrs_shapefiles(url, extract_to):
-    r = urllib.request.urlopen(url)
-    zip_file = zipfile.ZipFile(io.BytesIO(r.read()))
-    zip_file.extractall(extract_to)
-    zip_file.close()
-
-# Function to check if a point is within a specific path/row feature
-def check_point(feature, point, mode):
-    # Use shapely to create a polygon shape from feature geometry
-    polygon = shape(feature['geometry'])
-    if point.within(polygon) and feature['properties']['MODE'] == mode:
-        return True
-    return False
+import argparse
+import csv
+import itertools
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from metrics import timed
+from overpass_table import get_overpass_table, overpass_record
+from timezones import get_timezone, get_timezone_by_name
+from wrs_grid import NO_TILE, get_wrs_grid
 
 # Main function to get path and row for given coordinates
 def get_landsat_path_row(lat, lon, mode='D'):
-    # Download WRS-2 shapefiles if not already done
-    shapefile = 'landsat-path-row/WRS2_descending.shp'
-    url = "https://d9-wret.s3.us-west-2.amazonaws.com/assets/palladium/production/s3fs-public/atoms/files/WRS2_descending_0.zip"
+    # The WRS-2 grid is loaded and indexed once per process, see wrs_grid.py
+    grid = get_wrs_grid(mode)
+    return grid.lookup(float(lat), float(lon))
 
-    # Download and extract shapefiles
-    download_wrs_shapefiles(url, "landsat-path-row")
+# Function to get every (path, row, distance_km) covering the coordinates,
+# nearest scene center first. Overlapping scenes each give an overpass.
+def get_covering_path_rows(lat, lon, mode='D'):
+    grid = get_wrs_grid(mode)
+    return grid.lookup_all(float(lat), float(lon))
 
-    # Open the shapefile using Fiona
-    with fiona.open(shapefile) as shapefile_layer:
-        # Define point with given latitude and longitude
-        point = Point(lon, lat)
+# Batch version of get_landsat_path_row for arrays of coordinates, points
+# outside every tile get NO_TILE as path and row
+def get_landsat_path_rows(lats, lons, mode='D'):
+    grid = get_wrs_grid(mode)
+    return grid.lookup_many(lats, lons)
 
-        # Loop through features to find a matching one
-        for feature in shapefile_layer:
-            if check_point(feature, point, mode):
-                # Get path and row values from the matched feature
-                path = feature['properties']['PATH']
-                row = feature['properties']['ROW']
-                return path, row
+# Function to add path/row columns to a CSV of coordinates, one chunk at a time
+def convert_csv(input_path, output_path, mode='D', lat_column='latitude', lon_column='longitude', chunk_size=100000):
+    with open(input_path, newline='') as infile, open(output_path, 'w', newline='') as outfile:
+        reader = csv.reader(infile)
+        writer = csv.writer(outfile)
+        header = next(reader)
+        lat_index = header.index(lat_column)
+        lon_index = header.index(lon_column)
+        writer.writerow(header + ['path', 'row'])
 
-    # If no match is found, return None
-    return None, None
+        while True:
+            chunk = list(itertools.islice(reader, chunk_size))
+            if not chunk:
+                break
+            lats = np.array([record[lat_index] for record in chunk], dtype=np.float64)
+            lons = np.array([record[lon_index] for record in chunk], dtype=np.float64)
+            paths, rows = get_landsat_path_rows(lats, lons, mode)
+
+            # Points outside every tile are written with empty path/row cells
+            for record, path, row in zip(chunk, paths.tolist(), rows.tolist()):
+                if path == NO_TILE:
+                    writer.writerow(record + ['', ''])
+                else:
+                    writer.writerow(record + [path, row])
 
 # Cycle day paths dictionary
 cycle_day_paths = {
@@ -67,13 +71,54 @@ cycle_day_paths = {
     16: [6, 22, 38, 54, 70, 86, 95, 111, 127, 143, 159, 175, 191, 207, 223],
 }
 
+# Number of WRS-2 paths, the lookup tables below are indexed directly by path
+WRS_PATH_COUNT = 233
+
+# Function to build the path lookup tables from cycle_day_paths:
+#  - path_cycle_day[path]: cycle day of the path (0 if it isn't scheduled)
+#  - path_index_in_day[path]: position of the path within that day (-1 if unscheduled)
+# Some paths (90 to 96) are listed on two days. Every path is flown once per
+# 16-day cycle, so only the first day listing it is used, the same day
+# get_cycle_day has always returned.
+def build_path_tables(cycle_day_paths):
+    path_cycle_day = np.zeros(WRS_PATH_COUNT + 1, dtype=np.int8)
+    path_index_in_day = np.full(WRS_PATH_COUNT + 1, -1, dtype=np.int8)
+    for day in sorted(cycle_day_paths):
+        for index, path in enumerate(cycle_day_paths[day]):
+            if path_cycle_day[path] == 0:
+                path_cycle_day[path] = day
+                path_index_in_day[path] = index
+    return path_cycle_day, path_index_in_day
+
+PATH_CYCLE_DAY, PATH_INDEX_IN_DAY = build_path_tables(cycle_day_paths)
+
+# Function to check a path can be used to index the lookup tables
+def is_scheduled_path(path):
+    return 1 <= path <= WRS_PATH_COUNT and PATH_CYCLE_DAY[path] != 0
+
 # Function to get the cycle day based on the path
 def get_cycle_day(path):
-    for day, paths in cycle_day_paths.items():
-        if path in paths:
-            return day
+    if is_scheduled_path(path):
+        return int(PATH_CYCLE_DAY[path])
     return "Path not found in any cycle day"
 
+# Vectorized get_cycle_day for an array of paths, unknown paths give 0
+def get_cycle_day_array(paths):
+    paths = np.asarray(paths, dtype=np.intp)
+    valid = (paths >= 1) & (paths <= WRS_PATH_COUNT)
+    return np.where(valid, PATH_CYCLE_DAY[np.where(valid, paths, 0)], 0)
+
+# Vectorized position of each path within its cycle day, unknown paths give -1
+def get_path_index_in_day_array(paths):
+    paths = np.asarray(paths, dtype=np.intp)
+    valid = (paths >= 1) & (paths <= WRS_PATH_COUNT)
+    return np.where(valid, PATH_INDEX_IN_DAY[np.where(valid, paths, 0)], -1)
+
+# Function to get the current UTC time as a naive datetime. Cycle days and
+# overpass times are UTC, this is the date to step from.
+def utc_now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 # Function to calculate the next occurrence of the given cycle day
 def get_next_cycle_day(current_date, current_cycle_day):
     T = (current_date - datetime(2024, 10, 6)).days
@@ -86,16 +131,25 @@ def get_next_cycle_day(current_date, current_cycle_day):
     return next_date
 
 # Function to calculate time based on path and row
-def calculate_time(path, row, current_date, lat, lon):
+@timed('calculate_time')
+def calculate_time(path, row, current_date, lat, lon, mode='D'):
+    # Everything static about a tile is precomputed in the overpass table
+    # when it has been built, only the date arithmetic is left
+    table = get_overpass_table()
+    record = overpass_record(table, path, row, mode) if table is not None else None
+    if record is not None:
+        start_of_day = datetime.combine(current_date, datetime.min.time(), tzinfo=timezone.utc)
+        time_at_location = start_of_day + timedelta(minutes=float(record['minutes']))
+        return time_at_location.astimezone(get_timezone_by_name(record['timezone'].decode()))
+
     # Each path takes 98.8 minutes (approximately 1 hour 38.8 minutes), each row takes ~0.39 minutes
     time_per_path = 98.8  # in minutes
     time_per_row = 0.39  # in minutes
 
-    # Get the cycle day for the path
-    cycle_day = get_cycle_day(path)
-
     # Get the time spent on previous paths in the day
-    path_index_in_day = cycle_day_paths[cycle_day].index(path)
+    if not is_scheduled_path(path):
+        raise ValueError(f"Path {path} not found in any cycle day mapping")
+    path_index_in_day = int(PATH_INDEX_IN_DAY[path])
     total_time_on_paths = path_index_in_day * time_per_path
 
     # Add time spent on rows in the current path
@@ -104,24 +158,90 @@ def calculate_time(path, row, current_date, lat, lon):
     # Total time into the day
     total_minutes = total_time_on_paths + time_on_rows
 
-    # Convert total minutes to time
-    start_of_day = datetime.combine(current_date, datetime.min.time())
+    # Convert total minutes to time, counted from midnight UTC of the cycle day
+    start_of_day = datetime.combine(current_date, datetime.min.time(), tzinfo=timezone.utc)
     time_at_location = start_of_day + timedelta(minutes=total_minutes)
 
-    # Get the timezone based on the latitude and longitude
-    tf = TimezoneFinder()
-    timezone_str = tf.timezone_at(lat=lat, lng=lon)
-    local_timezone = pytz.timezone(timezone_str)
+    # Get the timezone based on the latitude and longitude (one shared,
+    # memoized finder per process, see timezones.py)
+    local_timezone = get_timezone(lat, lon)
 
     # Convert UTC time to local time
     time_at_location = time_at_location.astimezone(local_timezone)
     
     return time_at_location
+
+# Day the cycle-day numbering of get_next_cycle_day starts from, and the
+# overpass timing constants of calculate_time
+CYCLE_EPOCH = np.datetime64('2024-10-06', 'D')
+CYCLE_LENGTH = 16
+TIME_PER_PATH = 98.8  # in minutes
+TIME_PER_ROW = 0.39  # in minutes
+
+# Days each satellite is shifted from the cycle_day_paths table. Landsat 8
+# and Landsat 9 fly the same ground track half a cycle (8 days) apart.
+SATELLITE_DAY_OFFSETS = {'landsat8': 0, 'landsat9': 8}
+
+# Function to list every overpass between start_date (inclusive) and
+# end_date (exclusive) for arrays of paths and rows. Returns columns of equal
+# length: 'site' (index into the input arrays), 'path', 'row', 'satellite'
+# and 'time' as UTC datetime64, sorted by site then time.
+def get_overpass_schedule(paths, rows, start_date, end_date, satellites=tuple(SATELLITE_DAY_OFFSETS)):
+    paths = np.asarray(paths, dtype=np.intp)
+    rows = np.asarray(rows, dtype=np.intp)
+    cycle_days = get_cycle_day_array(paths)
+
+    # Time into the day of each overpass, the same formula as calculate_time
+    minutes = get_path_index_in_day_array(paths) * TIME_PER_PATH + rows * TIME_PER_ROW
+    time_of_day = np.round(minutes * 60000).astype('timedelta64[ms]')
+
+    start_day = (np.datetime64(start_date, 'D') - CYCLE_EPOCH).astype(np.int64)
+    end_day = (np.datetime64(end_date, 'D') - CYCLE_EPOCH).astype(np.int64)
+
+    sites, satellite_names, days = [], [], []
+    for satellite in satellites:
+        # Day d of the cycle falls on the days since the epoch that are d - 1 modulo 16
+        target = (cycle_days - 1 + SATELLITE_DAY_OFFSETS[satellite]) % CYCLE_LENGTH
+        first_day = start_day + (target - start_day) % CYCLE_LENGTH
+        counts = np.maximum(0, -(-(end_day - first_day) // CYCLE_LENGTH))
+        counts[cycle_days == 0] = 0
+
+        # Expand to one entry per overpass without a Python loop over sites
+        site = np.repeat(np.arange(len(paths)), counts)
+        nth = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        sites.append(site)
+        days.append(first_day[site] + nth * CYCLE_LENGTH)
+        satellite_names.append(np.full(len(site), satellite))
+
+    site = np.concatenate(sites)
+    day = np.concatenate(days)
+    times = CYCLE_EPOCH + day.astype('timedelta64[D]') + time_of_day[site]
+    order = np.lexsort((times, site))
+    return {
+        'site': site[order],
+        'path': paths[site[order]],
+        'row': rows[site[order]],
+        'satellite': np.concatenate(satellite_names)[order],
+        'time': times[order],
+    }
+
 # Example usage
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find the Landsat path/row and next overpass for coordinates.")
+    parser.add_argument('--csv', nargs=2, metavar=('INPUT', 'OUTPUT'), help="add path/row columns to every row of a CSV file")
+    parser.add_argument('--mode', default='D', choices=['D', 'A'], help="'D' for descending, 'A' for ascending")
+    parser.add_argument('--lat-column', default='latitude')
+    parser.add_argument('--lon-column', default='longitude')
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    args = parser.parse_args()
+
+    if args.csv:
+        convert_csv(args.csv[0], args.csv[1], args.mode, args.lat_column, args.lon_column, args.chunk_size)
+        raise SystemExit(0)
+
     latitude = 50.85
     longitude = -4.35
-    mode = 'D'  # 'D' for descending, 'A' for ascending
+    mode = args.mode
 
     path, row = get_landsat_path_row(latitude, longitude, mode)
     if path is not None and row is not None:
@@ -132,7 +252,7 @@ if __name__ == "__main__":
         print(f"The path {path} is in Day {cycle_day}.")
         
         # Get the current date
-        current_date = datetime.now()
+        current_date = utc_now()
         
         # Calculate the next cycle day occurrence
         next_cycle_date = get_next_cycle_day(current_date, cycle_day)
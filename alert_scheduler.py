@@ -0,0 +1,198 @@
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from LandsatCalc import calculate_time, get_cycle_day, get_landsat_path_row, get_next_cycle_day, utc_now
+
+# Where subscriptions are persisted, and how long before an overpass the alert goes out
+ALERT_STORE_PATH = os.environ.get('ALERT_STORE_PATH', 'alerts.sqlite3')
+ALERT_LEAD_TIME = timedelta(seconds=float(os.environ.get('ALERT_LEAD_SECONDS', 24 * 3600)))
+# How long after an overpass its alert still goes out, later ones count as
+# missed (the scheduler was down) and are dropped
+ALERT_GRACE_SECONDS = float(os.environ.get('ALERT_GRACE_SECONDS', 300))
+# Threads delivering alerts to the sinks, so a slow webhook doesn't hold up
+# the scheduler thread
+ALERT_SINK_WORKERS = int(os.environ.get('ALERT_SINK_WORKERS', 4))
+# How long to wait before trying again when a site's following overpass
+# can't be computed
+ALERT_RETRY_SECONDS = float(os.environ.get('ALERT_RETRY_SECONDS', 3600))
+
+# Function to compute the first overpass of a site strictly after a date
+def next_overpass(lat, lon, after):
+    path, row = get_landsat_path_row(lat, lon)
+    if path is None or row is None:
+        return None
+    cycle_day = get_cycle_day(path)
+    next_cycle_date = get_next_cycle_day(after, cycle_day)
+    return calculate_time(path, row, next_cycle_date, lat, lon)
+
+# Notification sinks are callables taking (site_id, lat, lon, overpass_time)
+
+# Sink printing the reminder, like the old send_notification
+def print_sink(site_id, lat, lon, overpass_time):
+    print(f"Reminder: Landsat satellite will overpass {site_id} on {overpass_time}.")
+
+# Sink keeping every alert in a list, a local stand-in for tests
+class MemorySink:
+    def __init__(self):
+        self.alerts = []
+
+    def __call__(self, site_id, lat, lon, overpass_time):
+        self.alerts.append((site_id, lat, lon, overpass_time))
+
+# Sink POSTing each alert as JSON to a webhook URL
+class WebhookSink:
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def __call__(self, site_id, lat, lon, overpass_time):
+        import urllib.request
+
+        body = json.dumps({'site_id': site_id, 'latitude': lat, 'longitude': lon,
+                           'overpass_time': overpass_time.isoformat()}).encode()
+        request = urllib.request.Request(self.url, data=body, headers={'Content-Type': 'application/json'})
+        urllib.request.urlopen(request, timeout=self.timeout).close()
+
+# Overpass alert scheduler: subscriptions sit in a min-heap keyed by the time
+# their alert is due, and a single thread sleeps until the earliest one.
+# After an alert fires the site's following overpass is computed and the
+# subscription goes back in the heap. Subscriptions are persisted in SQLite,
+# the sinks are called from a small thread pool.
+class AlertScheduler:
+    def __init__(self, sinks=(print_sink,), store_path=ALERT_STORE_PATH, lead_time=ALERT_LEAD_TIME,
+                 sink_workers=ALERT_SINK_WORKERS):
+        self.sinks = list(sinks)
+        self.executor = ThreadPoolExecutor(max_workers=sink_workers, thread_name_prefix='alert-sink')
+        self.lead_time = lead_time
+        self.connection = sqlite3.connect(store_path, check_same_thread=False, isolation_level=None)
+        if store_path != ':memory:':
+            self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS subscriptions ('
+            'site_id TEXT PRIMARY KEY, lat REAL NOT NULL, lon REAL NOT NULL, next_overpass TEXT NOT NULL)'
+        )
+        self.condition = threading.Condition()
+        self.heap = []
+        self.subscriptions = {}
+        self.stopped = False
+        self.thread = None
+
+        # Reload what was subscribed before a restart
+        for site_id, lat, lon, overpass in self.connection.execute('SELECT * FROM subscriptions').fetchall():
+            self._push(site_id, lat, lon, datetime.fromisoformat(overpass))
+
+    # Must be called with self.condition held (or before the thread starts)
+    def _push(self, site_id, lat, lon, overpass_time):
+        fire_at = overpass_time.timestamp() - self.lead_time.total_seconds()
+        self.subscriptions[site_id] = (lat, lon, overpass_time)
+        heapq.heappush(self.heap, (fire_at, site_id, overpass_time))
+        self.connection.execute(
+            'INSERT OR REPLACE INTO subscriptions VALUES (?, ?, ?, ?)',
+            (site_id, lat, lon, overpass_time.isoformat()),
+        )
+
+    # Subscribe a site, its first alert is for its next overpass (or for
+    # overpass_time if given). Re-subscribing a site replaces it.
+    def subscribe(self, site_id, lat, lon, overpass_time=None):
+        if overpass_time is None:
+            overpass_time = next_overpass(lat, lon, utc_now())
+            if overpass_time is None:
+                raise ValueError(f"No matching path/row found for the given coordinates: Latitude = {lat}, Longitude = {lon}.")
+        with self.condition:
+            self._push(site_id, lat, lon, overpass_time)
+            self.condition.notify()
+        return overpass_time
+
+    def unsubscribe(self, site_id):
+        with self.condition:
+            # The heap entry is skipped lazily when it comes up
+            self.subscriptions.pop(site_id, None)
+            self.connection.execute('DELETE FROM subscriptions WHERE site_id = ?', (site_id,))
+            self.condition.notify()
+
+    def __len__(self):
+        return len(self.subscriptions)
+
+    # Runs on the sink threads
+    def _deliver(self, sink, site_id, lat, lon, overpass_time):
+        try:
+            sink(site_id, lat, lon, overpass_time)
+        except Exception as e:
+            print(f"Alert sink failed for {site_id}: {e}")
+
+    # Fire every alert due at `now` (a timestamp), returns how many fired.
+    # An overpass more than ALERT_GRACE_SECONDS past at `now` (missed while
+    # the scheduler was down) isn't alerted, the subscription moves on to the
+    # site's next overpass. A site whose following overpass can't be computed
+    # is tried again ALERT_RETRY_SECONDS after its overpass went by, as a missed one.
+    def fire_due(self, now=None):
+        now = time.time() if now is None else now
+        due = []
+        with self.condition:
+            while self.heap and self.heap[0][0] <= now:
+                fire_at, site_id, overpass_time = heapq.heappop(self.heap)
+                current = self.subscriptions.get(site_id)
+                if current is None or current[2] != overpass_time:
+                    continue  # unsubscribed or re-subscribed since
+                due.append((site_id, current[0], current[1], overpass_time))
+
+        fired = 0
+        for site_id, lat, lon, overpass_time in due:
+            # The cycle day arithmetic works on naive UTC dates
+            if overpass_time.timestamp() + ALERT_GRACE_SECONDS < now:
+                after = datetime.fromtimestamp(now, timezone.utc).replace(tzinfo=None)
+            else:
+                for sink in self.sinks:
+                    self.executor.submit(self._deliver, sink, site_id, lat, lon, overpass_time)
+                fired += 1
+                after = overpass_time.astimezone(timezone.utc).replace(tzinfo=None)
+            try:
+                following = next_overpass(lat, lon, after)
+            except Exception as e:
+                print(f"Next overpass of {site_id} failed: {e}")
+                following = None
+
+            with self.condition:
+                if self.subscriptions.get(site_id, (None, None, None))[2] != overpass_time:
+                    continue
+                if following is not None:
+                    self._push(site_id, lat, lon, following)
+                else:
+                    retry_at = max(now, overpass_time.timestamp() + ALERT_GRACE_SECONDS) + ALERT_RETRY_SECONDS
+                    heapq.heappush(self.heap, (retry_at, site_id, overpass_time))
+        return fired
+
+    # Seconds until the earliest alert, None if there is nothing subscribed
+    def _time_to_next(self):
+        if not self.heap:
+            return None
+        return max(0.0, self.heap[0][0] - time.time())
+
+    def run_forever(self):
+        while True:
+            with self.condition:
+                if self.stopped:
+                    return
+                timeout = self._time_to_next()
+                if timeout is None or timeout > 0:
+                    # Woken early by subscribe/unsubscribe/stop
+                    self.condition.wait(timeout)
+                    continue
+            self.fire_due()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run_forever, name='alert-scheduler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+        self.executor.shutdown(wait=True)
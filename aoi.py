@@ -0,0 +1,86 @@
+import json
+import numpy as np
+from LandsatCalc import SATELLITE_DAY_OFFSETS, get_cycle_day_array, get_overpass_schedule
+from metrics import timed
+from wrs_grid import get_wrs_grid
+
+# Function to turn an area of interest into one shapely geometry. Accepts a
+# GeoJSON geometry, Feature or FeatureCollection (as a dict or a JSON
+# string) or a WKT string. Raises ValueError if it isn't a usable area.
+def parse_aoi(value):
+    import shapely
+    from shapely.geometry import shape
+
+    if isinstance(value, str):
+        text = value.strip()
+        value = json.loads(text) if text.startswith('{') else text
+    if isinstance(value, str):
+        try:
+            geometry = shapely.from_wkt(value)
+        except shapely.errors.ShapelyError as e:
+            raise ValueError(f"Invalid WKT: {e}")
+    elif isinstance(value, dict):
+        try:
+            if value.get('type') == 'FeatureCollection':
+                geometry = shapely.union_all([shape(feature['geometry']) for feature in value.get('features', [])])
+            elif value.get('type') == 'Feature':
+                geometry = shape(value['geometry'])
+            else:
+                geometry = shape(value)
+        except (shapely.errors.ShapelyError, AttributeError, KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid GeoJSON: {e!r}")
+    else:
+        raise ValueError("The area of interest must be GeoJSON or WKT.")
+
+    # Self-intersecting rings are common in hand-drawn polygons
+    geometry = shapely.make_valid(geometry)
+    if geometry.is_empty or geometry.area == 0:
+        raise ValueError("The area of interest must be a polygon with a non-zero area.")
+    return geometry
+
+# Function to find every tile intersecting the AOI. Returns columns: 'path',
+# 'row', 'cycle_day', 'aoi_fraction' (share of the AOI inside the tile),
+# 'tile_fraction' (share of the tile inside the AOI) and 'geometry' (the
+# part of the AOI inside the tile), ordered by path and row.
+@timed('aoi_tiles')
+def aoi_tiles(aoi, mode='D'):
+    grid = get_wrs_grid(mode)
+    indices, aoi_fractions, tile_fractions, parts = grid.intersect(aoi)
+    order = np.lexsort((grid.rows[indices], grid.paths[indices]))
+    paths = grid.paths[indices][order].astype(np.intp)
+    return {
+        'path': paths,
+        'row': grid.rows[indices][order].astype(np.intp),
+        'cycle_day': get_cycle_day_array(paths),
+        'aoi_fraction': aoi_fractions[order],
+        'tile_fraction': tile_fractions[order],
+        'geometry': parts[order],
+    }
+
+# Function to merge the overpass schedule of the AOI's tiles into passes.
+# The rows of a path are imaged minutes apart, so each satellite, path and
+# day is one pass; its aoi_fraction is the share of the AOI seen on that
+# pass by all its rows together. Passes are sorted by time.
+@timed('aoi_schedule')
+def aoi_passes(tiles, aoi, start_date, end_date, satellites=tuple(SATELLITE_DAY_OFFSETS)):
+    import shapely
+
+    # Share of the AOI covered by each path, overlapping rows counted once
+    path_fractions = {}
+    for path in np.unique(tiles['path']).tolist():
+        covered = shapely.union_all(tiles['geometry'][tiles['path'] == path])
+        path_fractions[path] = min(1.0, covered.area / aoi.area)
+
+    schedule = get_overpass_schedule(tiles['path'], tiles['row'], start_date, end_date, satellites)
+    passes = {}
+    for path, row, satellite, time in zip(schedule['path'].tolist(), schedule['row'].tolist(),
+                                          schedule['satellite'].tolist(), schedule['time']):
+        key = (satellite, path, time.astype('datetime64[D]'))
+        entry = passes.get(key)
+        if entry is None:
+            passes[key] = {'time': time, 'satellite': satellite, 'path': path, 'rows': [row],
+                           'aoi_fraction': path_fractions[path]}
+        else:
+            entry['time'] = min(entry['time'], time)
+            entry['rows'].append(row)
+    return sorted(passes.values(), key=lambda entry: entry['time'])
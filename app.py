@@ -1,160 +1,100 @@
-from flask import Flask, render_template, request, jsonify
+from aoi import aoi_passes, aoi_tiles, parse_aoi
+from gazetteer import GeocoderBusyError, geocode, geocoder_stats
+from flask import Flask, Response, g, render_template, request, jsonify, stream_with_context
 from flask_cors import CORS
-import io
-import urllib.request
-import zipfile
-import fiona
-from shapely.geometry import shape, Point, mapping
-from datetime import datetime, timedelta
-import pytz
-from timezonefinder import TimezoneFinder
 from datetime import datetime
-from landsatxplore.api import API
-from shapely.wkt import loads
-from LandsatCalc import get_landsat_path_row
-import json
+from geojson_stream import compress_chunks, iter_feature_collection, negotiate_encoding, scene_feature
+from metrics import PROFILER_ENABLED, SERVER_TIMING, begin_request, end_request, get_profiler, observe, render_metrics, server_timing_header
+from LandsatCalc import SATELLITE_DAY_OFFSETS, PATH_CYCLE_DAY, calculate_time, get_landsat_path_row, get_cycle_day_array, get_landsat_path_rows, get_next_cycle_day, get_overpass_schedule, is_scheduled_path, utc_now
+from overpass_table import get_overpass_table
+from scene_api import get_api_pool
+from scene_cache import cached_search, get_scene_cache
+from scene_store import SCENE_SYNC_START, get_scene_store
+from wrs_grid import NO_TILE, WRS_MODES, get_tile_cache
+from wrs_tiles import WRS_TILE_MAX_AGE, WRS_TILE_MAX_ZOOM, WRS_TILE_MIN_ZOOM, WRS_TILE_VERSION, get_tile, is_valid_tile
+import gzip
+import os
+import time
+import numpy as np
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for cross-origin resource sharing
 
-# Functions as provided earlier...
-def download_wrs_shapefiles(url, extract_to):
-    r = urllib.request.urlopen(url)
-    zip_file = zipfile.ZipFile(io.BytesIO(r.read()))
-    zip_file.extractall(extract_to)
-    zip_file.close()
-
-def check_point(feature, point, mode):
-    polygon = shape(feature['geometry'])
-    if point.within(polygon) and feature['properties']['MODE'] == mode:
-        return True
-    return False
-
-def get_landsat_path_row(lat, lon, mode='D'):
-    shapefile = 'landsat-path-row/WRS2_descending.shp'
-    url = "https://d9-wret.s3.us-west-2.amazonaws.com/assets/palladium/production/s3fs-public/atoms/files/WRS2_descending_0.zip"
-    download_wrs_shapefiles(url, "landsat-path-row")
-    lat = float(lat)
-    lon = float(lon)
-    print(f"Latitude: {lat}, Type: {type(lat)}")
-
-    with fiona.open(shapefile) as shapefile_layer:
-        point = Point(lon, lat)
-        for feature in shapefile_layer:
-            if check_point(feature, point, mode):
-                path = feature['properties']['PATH']
-                row = feature['properties']['ROW']
-                return path, row
-    return None, None
-
-cycle_day_paths = {
-        1: [13, 29, 45, 61, 77, 93, 102, 118, 134, 150, 166, 182, 198, 214, 230],
-        2: [4, 20, 36, 52, 68, 84, 93, 109, 125, 141, 157, 173, 189, 205, 221],
-        3: [11, 27, 43, 59, 75, 91, 100, 116, 132, 148, 164, 180, 196, 212, 228],
-        4: [2, 18, 34, 50, 66, 82, 91, 107, 123, 139, 155, 171, 187, 203, 219],
-        5: [9, 25, 41, 57, 73, 89, 98, 114, 130, 146, 162, 178, 194, 210, 226],
-        6: [16, 32, 48, 64, 80, 96, 105, 121, 137, 153, 169, 185, 201, 217, 233],
-        7: [7, 23, 39, 55, 71, 87, 96, 112, 128, 144, 160, 176, 192, 208, 224],
-        8: [14, 30, 46, 62, 78, 94, 103, 119, 135, 151, 167, 183, 199, 215, 231],
-        9: [5, 21, 37, 53, 69, 85, 94, 110, 126, 142, 158, 174, 190, 206, 222],
-        10: [12, 28, 44, 60, 76, 92, 101, 117, 133, 149, 165, 181, 197, 213, 229],
-        11: [3, 19, 35, 51, 67, 83, 92, 108, 124, 140, 156, 172, 188, 204, 220],
-        12: [10, 26, 42, 58, 74, 90, 99, 115, 131, 147, 163, 179, 195, 211, 227],
-        13: [1, 17, 33, 49, 65, 81, 90, 106, 122, 138, 154, 170, 186, 202, 218],
-        14: [8, 24, 40, 56, 72, 88, 97, 113, 129, 145, 161, 177, 193, 209, 225],
-        15: [15, 31, 47, 63, 79, 95, 104, 120, 136, 152, 168, 184, 200, 216, 232],
-        16: [6, 22, 38, 54, 70, 86, 95, 111, 127, 143, 159, 175, 191, 207, 223],
-    }
+# Open the prebuilt per-tile overpass records (see overpass_table.py) at
+# startup. They are memory-mapped, so every worker process shares the same pages.
+get_overpass_table()
+
+# Largest /get_schedule request: date window in days and number of sites
+SCHEDULE_MAX_DAYS = int(os.environ.get('SCHEDULE_MAX_DAYS', 3 * 366))
+SCHEDULE_MAX_SITES = int(os.environ.get('SCHEDULE_MAX_SITES', 10000))
+# Largest /get_time_batch request, in points
+TIME_BATCH_MAX_POINTS = int(os.environ.get('TIME_BATCH_MAX_POINTS', 10000))
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+    if SERVER_TIMING:
+        begin_request()
+
+# Request latency histogram per endpoint, and the stage timings as a
+# Server-Timing header when enabled. Streamed responses are timed up to their
+# headers, the body is produced afterwards.
+@app.after_request
+def record_timing(response):
+    elapsed = time.perf_counter() - g.request_start
+    observe('landsat_request_seconds', elapsed, endpoint=request.endpoint or 'unknown')
+    if SERVER_TIMING:
+        timings = end_request() + [('total', elapsed)]
+        response.headers['Server-Timing'] = server_timing_header(timings)
+    return response
 
 def get_cycle_day(path):
-    # Check if cycle_day_paths is a dictionary
-    if not isinstance(cycle_day_paths, dict):
-        raise ValueError("cycle_day_paths should be a dictionary mapping days to paths")
-
-    # Find the corresponding cycle day for the given path
-    for day, paths in cycle_day_paths.items():
-        if path in paths:
-            return day
-
-    # If no match is found, raise an error
-    raise ValueError(f"Path {path} not found in any cycle day mapping")
-
-
-def get_next_cycle_day(current_date, current_cycle_day):
-    T = (current_date - datetime(2024, 10, 6)).days
-    next_day_offset = ((current_cycle_day - 1) + 16 - (T % 16)) % 16
-    if next_day_offset == 0:
-        next_day_offset = 16
-    next_date = current_date + timedelta(days=next_day_offset)
-    return next_date
-
-def calculate_time(path, row, current_date, lat, lon):
-    # Each path takes 98.8 minutes (approximately 1 hour 38.8 minutes), each row takes ~0.39 minutes
-    time_per_path = 98.8  # in minutes
-    time_per_row = 0.39  # in minutes
-    # Get the cycle day for the path
-    cycle_day = get_cycle_day(path)
-    # Get the time spent on previous paths in the day
-    path_index_in_day = cycle_day_paths[cycle_day].index(path)
-    total_time_on_paths = path_index_in_day * time_per_path
-
-    # Add time spent on rows in the current path
-    time_on_rows = row * time_per_row
-
-    # Total time into the day
-    total_minutes = total_time_on_paths + time_on_rows
-
-    # Convert total minutes to time
-    start_of_day = datetime.combine(current_date, datetime.min.time())
-    time_at_location = start_of_day + timedelta(minutes=total_minutes)
-
-    # Get the timezone based on the latitude and longitude
-    tf = TimezoneFinder()
-    timezone_str = tf.timezone_at(lat=lat, lng=lon)
-    local_timezone = pytz.timezone(timezone_str)
-
-    # Convert UTC time to local time
-    time_at_location = time_at_location.astimezone(local_timezone)
-    
-    return time_at_location
-
-# Update your existing function to fetch Landsat scenes and return them as GeoJSON
-def search_landsat_scenes(lat, lon, start_date, end_date):
-    api = API('samahosam', 'Sasosaso@2022')
+    # Cycle day comes from the prebuilt per-path table in LandsatCalc.py
+    if not is_scheduled_path(path):
+        raise ValueError(f"Path {path} not found in any cycle day mapping")
+    return int(PATH_CYCLE_DAY[path])
+
+# Function to find the scenes covering a point, yielded one at a time
+def find_landsat_scenes(lat, lon, start_date, end_date):
     lat = float(lat)
     lon = float(lon)
     path, row = get_landsat_path_row(lat, lon)
     if path is None or row is None:
-        return []  # Return an empty list if no matching path/row found
-    scenes = api.search(
-        dataset='landsat_ot_c2_l2',
-        latitude=lat,
-        longitude=lon,
-        start_date=start_date,
-        end_date=end_date,
-        max_cloud_cover=10
-    )
-    api.logout()
-
-    geojson_data = {"type": "FeatureCollection", "features": []}
-
-    # Convert each scene's spatial_coverage to GeoJSON format
-    for scene in scenes:
-        wkt_string = str(scene['spatial_coverage'])
-        print(f"WKT string: {wkt_string}, Type: {type(wkt_string)}")
-        polygon = loads(wkt_string)
-        feature = {
-            "type": "Feature",
-            "geometry": mapping(polygon),
-            "properties": {
-                "scene_id": scene["entity_id"],
-                "acquisition_date": scene["acquisition_date"],
-                "cloud_cover": scene["cloud_cover"],
-            }
-        }
-        geojson_data["features"].append(feature)
-    
-    return geojson_data
+        return iter(())  # Nothing to yield if no matching path/row found
+
+    # The store holds every scene since SCENE_SYNC_START, earlier ranges are
+    # searched upstream through the scene cache
+    if str(start_date)[:10] < SCENE_SYNC_START:
+        scenes = cached_search(lat, lon, path, row, start_date, end_date, dataset='landsat_ot_c2_l2', max_cloud_cover=10)
+        return iter(sorted(scenes, key=lambda scene: scene['acquisition_date']))
+
+    # Scenes are answered from the local scene store, which only asks the API
+    # for acquisitions newer than what it already has for this tile
+    store = get_scene_store()
+    store.ensure_synced(path, row, 'landsat_ot_c2_l2')
+    return store.iter_query(lat, lon, start_date, end_date, max_cloud_cover=10, dataset='landsat_ot_c2_l2')
+
+# Function to read the dates and the optional coordinate rounding (decimals)
+# and simplification tolerance (degrees) of a scene request. Checked before
+# the response starts streaming, a bad value would otherwise cut it short.
+def parse_scene_options(data):
+    start_date = data.get("start_date", "2024-01-01")
+    end_date = data.get("end_date", "2024-10-01")
+    try:
+        datetime.fromisoformat(str(start_date)[:10])
+        datetime.fromisoformat(str(end_date)[:10])
+    except ValueError:
+        raise ValueError('start_date and end_date must be YYYY-MM-DD dates.')
+
+    precision = data.get("precision")
+    if precision is not None:
+        if isinstance(precision, bool) or not isinstance(precision, int) or not 0 <= precision <= 15:
+            raise ValueError('precision must be an integer between 0 and 15.')
+    tolerance = data.get("tolerance")
+    if tolerance is not None:
+        if isinstance(tolerance, bool) or not isinstance(tolerance, (int, float)) or not 0 <= tolerance < 180:
+            raise ValueError('tolerance must be a number of degrees between 0 and 180.')
+    return start_date, end_date, precision, tolerance
 
 # Define a route to get polygons as GeoJSON
 @app.route('/get_polygons', methods=['POST'])
@@ -162,13 +102,22 @@ def get_polygons():
     data = request.get_json()
     lat = float(data.get("latitude"))
     lon = float(data.get("longitude"))
-    start_date = data.get("start_date", "2024-01-01")
-    end_date = data.get("end_date", "2024-10-01")
-
-    # Search Landsat scenes
-    polygons = search_landsat_scenes(lat, lon, start_date, end_date)
-    
-    return jsonify(polygons)
+    try:
+        start_date, end_date, precision, tolerance = parse_scene_options(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Search Landsat scenes, then stream the features out as they are converted
+    scenes = find_landsat_scenes(lat, lon, start_date, end_date)
+    features = (scene_feature(scene, precision, tolerance) for scene in scenes)
+    encoding = negotiate_encoding(request.accept_encodings)
+    body = compress_chunks(iter_feature_collection(features, app.json.dumps), encoding)
+
+    response = Response(stream_with_context(body), mimetype='application/geo+json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
 
 @app.route('/')
 def index():
@@ -176,7 +125,7 @@ def index():
 
 @app.route('/landsat')
 def landsat():
-    return render_template('landsat.html')
+    return render_template('landsat.html', grid_min_zoom=WRS_TILE_MIN_ZOOM, grid_max_zoom=WRS_TILE_MAX_ZOOM)
 
 @app.route('/live')
 def live():
@@ -186,39 +135,323 @@ def live():
 def about():
     return render_template('about.html')
 
-@app.route('/get_time', methods=['POST'])
+# Function to get the next overpass of every scheduled scene covering the
+# coordinates, as (time_at_location, path, row, cycle_day, distance_km,
+# next_cycle_date) tuples. Nearby points inside the same tiles are answered
+# from the quantized cache.
+def find_overpasses(lat, lon, current_date, mode='D'):
+    tiles = [tile for tile in get_tile_cache(mode).lookup_all(lat, lon) if is_scheduled_path(tile[0])]
+    overpasses = []
+    for path, row, distance in tiles:
+        cycle_day = get_cycle_day(path)
+        next_cycle_date = get_next_cycle_day(current_date, cycle_day)
+        time_at_location = calculate_time(path, row, next_cycle_date, lat, lon, mode)
+        overpasses.append((time_at_location, path, row, cycle_day, distance, next_cycle_date))
+    return overpasses
+
+# Function to describe the earliest overpass and every covering scene
+def overpass_response(overpasses):
+    time_at_location, path, row, cycle_day, _, _ = min(overpasses)
+    return {
+        'path': path,
+        'row': row,
+        'cycle_day': cycle_day,
+        'time_at_location': time_at_location.strftime('%Y-%m-%d %H:%M:%S %Z'),
+        'tiles': [
+            {
+                'path': tile_path,
+                'row': tile_row,
+                'cycle_day': tile_cycle_day,
+                'distance_km': round(distance, 1),
+                'time_at_location': tile_time.strftime('%Y-%m-%d %H:%M:%S %Z'),
+            }
+            for tile_time, tile_path, tile_row, tile_cycle_day, distance, _ in overpasses
+        ],
+    }
+
+# GET /get_time?latitude=..&longitude=.. answers the same as the POST, and
+# can be cached by browsers and CDNs
+@app.route('/get_time', methods=['GET', 'POST'])
 def get_time():
-    data = request.json
+    data = request.args if request.method == 'GET' else request.json
     lat = float(data.get('latitude'))
     lon = float(data.get('longitude'))
     mode = 'D'  # Default to descending for now
 
-    print(f"Received coordinates: Latitude = {lat}, Longitude = {lon}")
-
-    # Calculate the next Landsat time for the given coordinates
-    path, row = get_landsat_path_row(lat, lon, mode)
-    print(f"Computed Path: {path}, Row: {row}")
-
-    if path is not None and row is not None:
-        cycle_day = get_cycle_day(path)
-
-        current_date = datetime.now()
-        next_cycle_date = get_next_cycle_day(current_date, cycle_day)
-        time_at_location = calculate_time(path, row, next_cycle_date, lat, lon)
-
-        response = {
-            'path': path,
-            'row': row,
-            'cycle_day': cycle_day,
-            #'next_date': next_cycle_date.strftime('%Y-%m-%d'),
-            'time_at_location': time_at_location.strftime('%Y-%m-%d %H:%M:%S %Z')
-        }
-    else:
+    # Next overpass of each covering scene, the earliest one is the answer
+    current_date = utc_now()
+    overpasses = find_overpasses(lat, lon, current_date, mode)
+    if not overpasses:
         response = {
             'error': f'No matching path/row found for the given coordinates: Latitude = {lat}, Longitude = {lon}.'
         }
+        return jsonify(response)
+
+    # The answer only changes when one of the next cycle dates moves on,
+    # which is at the start of that day
+    response = jsonify(overpass_response(overpasses))
+    response.set_etag(mode + '_'.join(f'{tile_path}-{tile_row}-{next_cycle_date:%Y%m%d}'
+                                      for _, tile_path, tile_row, _, _, next_cycle_date in overpasses))
+    expires = min(datetime.combine(overpass[5].date(), datetime.min.time()) for overpass in overpasses)
+    response.cache_control.public = True
+    response.cache_control.max_age = max(0, int((expires - current_date).total_seconds()))
+    return response.make_conditional(request)
+
+# Place search: GET /locate?q=Milano&limit=5. The places come from the local
+# gazetteer, or the upstream geocoder when it has no match (see gazetteer.py).
+# The best match also gets its path/row and next overpass, like /get_time.
+# With overpass=0 only the local places are returned, for autocomplete (the
+# Nominatim usage policy doesn't allow autocomplete queries).
+@app.route('/locate')
+def locate():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'The q parameter is required.'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 5)), 1), 20)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer.'}), 400
+    with_overpass = request.args.get('overpass', '1') != '0'
+
+    try:
+        source, results = geocode(query, limit, upstream=with_overpass)
+    except GeocoderBusyError as e:
+        return jsonify({'error': str(e)}), 503
+    response = {'query': query, 'source': source, 'results': results}
+    if not results:
+        response['error'] = f'Location not found: {query}.'
+    elif with_overpass:
+        lat, lon = results[0]['latitude'], results[0]['longitude']
+        overpasses = find_overpasses(lat, lon, utc_now())
+        if overpasses:
+            response['overpass'] = overpass_response(overpasses)
+        else:
+            response['overpass'] = {
+                'error': f'No matching path/row found for the given coordinates: Latitude = {lat}, Longitude = {lon}.'
+            }
+    return jsonify(response)
+
+# Function to read the WRS-2 mode of a request, 'D' (descending) by default
+def parse_mode(data):
+    mode = data.get('mode', 'D')
+    if mode not in WRS_MODES:
+        raise ValueError(f'mode must be one of {list(WRS_MODES)}.')
+    return mode
+
+# Function to read the points of a /get_time_batch request as float arrays
+def parse_batch_points(data):
+    latitudes = data.get('latitudes', [])
+    longitudes = data.get('longitudes', [])
+    if not isinstance(latitudes, list) or not isinstance(longitudes, list):
+        raise ValueError('latitudes and longitudes must be lists.')
+    if len(latitudes) != len(longitudes):
+        raise ValueError('latitudes and longitudes must have the same length.')
+    if len(latitudes) > TIME_BATCH_MAX_POINTS:
+        raise ValueError(f'At most {TIME_BATCH_MAX_POINTS} points per request.')
+    try:
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError('latitudes and longitudes must be lists of numbers.')
+    if latitudes.ndim != 1 or longitudes.ndim != 1:
+        raise ValueError('latitudes and longitudes must be lists of numbers.')
+    return latitudes, longitudes
+
+@app.route('/get_time_batch', methods=['POST'])
+def get_time_batch():
+    data = request.json
+    try:
+        mode = parse_mode(data)
+        latitudes, longitudes = parse_batch_points(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # One vectorized lookup for all points, the response is columnar with
+    # null entries for points outside every tile
+    paths, rows = get_landsat_path_rows(latitudes, longitudes, mode)
+
+    cycle_days = get_cycle_day_array(paths)
+
+    current_date = utc_now()
+    response = {'path': [], 'row': [], 'cycle_day': [], 'time_at_location': []}
+    for lat, lon, path, row, cycle_day in zip(latitudes.tolist(), longitudes.tolist(), paths.tolist(), rows.tolist(), cycle_days.tolist()):
+        if path == NO_TILE or cycle_day == 0:
+            response['path'].append(None if path == NO_TILE else path)
+            response['row'].append(None if path == NO_TILE else row)
+            response['cycle_day'].append(None)
+            response['time_at_location'].append(None)
+            continue
+
+        next_cycle_date = get_next_cycle_day(current_date, cycle_day)
+        time_at_location = calculate_time(path, row, next_cycle_date, lat, lon, mode)
+        response['path'].append(path)
+        response['row'].append(row)
+        response['cycle_day'].append(cycle_day)
+        response['time_at_location'].append(time_at_location.strftime('%Y-%m-%d %H:%M:%S %Z'))
 
     return jsonify(response)
 
+# Function to read the date range and satellites of a schedule request.
+# Defaults to the next `months` (3) months from today and both satellites.
+# Windows longer than SCHEDULE_MAX_DAYS are refused.
+def parse_schedule_window(data):
+    start_date = np.datetime64(data.get('start_date', utc_now().strftime('%Y-%m-%d')), 'D')
+    if 'end_date' in data:
+        end_date = np.datetime64(data['end_date'], 'D')
+    else:
+        # Default to the next N months, keeping the day of the month
+        start_month = start_date.astype('datetime64[M]')
+        end_date = (start_month + int(data.get('months', 3))).astype('datetime64[D]') + (start_date - start_month.astype('datetime64[D]'))
+    if end_date < start_date:
+        raise ValueError('end_date must not be before start_date.')
+    if end_date - start_date > np.timedelta64(SCHEDULE_MAX_DAYS, 'D'):
+        raise ValueError(f'The schedule window can be at most {SCHEDULE_MAX_DAYS} days.')
+    satellites = data.get('satellites', list(SATELLITE_DAY_OFFSETS))
+    if any(satellite not in SATELLITE_DAY_OFFSETS for satellite in satellites):
+        raise ValueError(f'satellites must be among {list(SATELLITE_DAY_OFFSETS)}.')
+    return start_date, end_date, satellites
+
+# Function to read the sites of a schedule request, given either as paths and
+# rows or as latitudes and longitudes. Returns the (paths, rows) arrays.
+def parse_schedule_sites(data):
+    if 'paths' in data:
+        paths, rows, names = data.get('paths', []), data.get('rows', []), 'paths and rows'
+    else:
+        paths, rows, names = data.get('latitudes', []), data.get('longitudes', []), 'latitudes and longitudes'
+    if not isinstance(paths, list) or not isinstance(rows, list):
+        raise ValueError(f'{names} must be lists.')
+    if len(paths) != len(rows):
+        raise ValueError(f'{names} must have the same length.')
+    if len(paths) > SCHEDULE_MAX_SITES:
+        raise ValueError(f'At most {SCHEDULE_MAX_SITES} sites per request.')
+
+    mode = None if 'paths' in data else parse_mode(data)
+    try:
+        dtype = np.intp if mode is None else np.float64
+        paths, rows = np.asarray(paths, dtype=dtype), np.asarray(rows, dtype=dtype)
+    except (TypeError, ValueError):
+        raise ValueError(f'{names} must be lists of numbers.')
+    if paths.ndim != 1 or rows.ndim != 1:
+        raise ValueError(f'{names} must be lists of numbers.')
+    if mode is None:
+        return paths, rows
+    return get_landsat_path_rows(paths, rows, mode)
+
+@app.route('/get_schedule', methods=['POST'])
+def get_schedule():
+    data = request.json
+    try:
+        paths, rows = parse_schedule_sites(data)
+        start_date, end_date, satellites = parse_schedule_window(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Columnar response, one entry per overpass; 'site' points back into the request arrays
+    schedule = get_overpass_schedule(paths, rows, start_date, end_date, satellites)
+    return jsonify({
+        'site': schedule['site'].tolist(),
+        'path': schedule['path'].tolist(),
+        'row': schedule['row'].tolist(),
+        'satellite': schedule['satellite'].tolist(),
+        'time': np.datetime_as_string(schedule['time'], unit='s', timezone='UTC').tolist(),
+    })
+
+# Area of interest mode: 'aoi' is a GeoJSON geometry, Feature or
+# FeatureCollection, or a WKT string. Returns every tile the area touches
+# with its coverage fractions, and the merged overpass passes over the area
+# (same date range and satellite options as /get_schedule).
+@app.route('/get_aoi', methods=['POST'])
+def get_aoi():
+    data = request.json
+    try:
+        mode = parse_mode(data)
+        aoi = parse_aoi(data.get('aoi'))
+        start_date, end_date, satellites = parse_schedule_window(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    tiles = aoi_tiles(aoi, mode)
+    passes = aoi_passes(tiles, aoi, start_date, end_date, satellites)
+    return jsonify({
+        'tiles': {
+            'path': tiles['path'].tolist(),
+            'row': tiles['row'].tolist(),
+            'cycle_day': tiles['cycle_day'].tolist(),
+            'aoi_fraction': np.round(tiles['aoi_fraction'], 4).tolist(),
+            'tile_fraction': np.round(tiles['tile_fraction'], 6).tolist(),
+        },
+        'passes': [
+            {
+                'time': np.datetime_as_string(entry['time'], unit='s', timezone='UTC'),
+                'satellite': entry['satellite'],
+                'path': entry['path'],
+                'rows': entry['rows'],
+                'aoi_fraction': round(entry['aoi_fraction'], 4),
+            }
+            for entry in passes
+        ],
+    })
+
+# WRS-2 grid map tiles as GeoJSON, rendered once per tile and kept on disk
+# gzipped (see wrs_tiles.py). A tile never changes for a given tile version.
+@app.route('/tiles/<int:z>/<int:x>/<int:y>.geojson')
+def wrs_tile(z, x, y):
+    if not is_valid_tile(z, x, y):
+        return jsonify({'error': f'No such tile: {z}/{x}/{y}.'}), 404
+
+    data = get_tile(z, x, y)
+    if 'gzip' in request.accept_encodings:
+        response = Response(data, mimetype='application/geo+json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(gzip.decompress(data), mimetype='application/geo+json')
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.set_etag(f'wrs-v{WRS_TILE_VERSION}-{z}-{x}-{y}')
+    response.cache_control.public = True
+    response.cache_control.max_age = WRS_TILE_MAX_AGE
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
+@app.route('/stats')
+def stats():
+    # Hit/miss counters and latency of the API client pool, the scene store
+    # syncs and the scene cache (searches before SCENE_SYNC_START)
+    return jsonify({
+        'api_pool': get_api_pool().stats(),
+        'scene_store': get_scene_store().stats(),
+        'scene_cache': get_scene_cache().stats(),
+        'tile_cache': get_tile_cache().stats(),
+        'geocoder': geocoder_stats(),
+    })
+
+@app.route('/metrics')
+def metrics():
+    # Stage and request latency histograms in the Prometheus text format
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+# Sampling profiler, switched on and off at runtime:
+#   POST /profiler {"action": "start", "interval": 0.005}, then "stop" or "clear"
+#   GET /profiler returns the samples as collapsed stacks for flamegraph tools
+@app.route('/profiler', methods=['GET', 'POST'])
+def profiler():
+    if not PROFILER_ENABLED:
+        return jsonify({'error': 'The profiler is disabled, set PROFILER_ENABLED=1 to use it.'}), 404
+    sampler = get_profiler()
+    if request.method == 'GET':
+        return Response(sampler.collapsed(), mimetype='text/plain')
+
+    data = request.get_json(silent=True) or {}
+    action = data.get('action')
+    if action == 'start':
+        sampler.start(data.get('interval'))
+    elif action == 'stop':
+        sampler.stop()
+    elif action == 'clear':
+        sampler.clear()
+    else:
+        return jsonify({'error': "action must be 'start', 'stop' or 'clear'."}), 400
+    return jsonify({'running': sampler.running, 'interval': sampler.interval})
+
+# Development server only, production runs gunicorn -c gunicorn.conf.py (see wsgi.py)
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,85 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Import-time budgets in milliseconds for the entry points. Heavy libraries
+# (shapely, fiona, pytz, timezonefinder, landsatxplore, matplotlib) are only
+# imported on the code paths that use them, so a module pulling one of them in
+# at load time shows up here as a blown budget.
+STARTUP_BUDGETS = {
+    'LandsatCalc': float(os.environ.get('STARTUP_BUDGET_CORE', 150)),
+    'api': float(os.environ.get('STARTUP_BUDGET_API', 150)),
+    'landsat_api_integration': float(os.environ.get('STARTUP_BUDGET_INTEGRATION', 150)),
+    'app': float(os.environ.get('STARTUP_BUDGET_APP', 300)),
+}
+
+# Function to parse the output of python -X importtime into
+# (depth, module, self_us, cumulative_us) tuples
+def parse_importtime(stderr):
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((depth, name.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+# Function to import a module in a fresh interpreter and return its import
+# time in milliseconds along with the parsed importtime entries
+def measure_import(module):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+    entries = parse_importtime(result.stderr)
+    for depth, name, self_us, cumulative_us in entries:
+        if name == module and depth == 0:
+            return cumulative_us / 1000, entries
+    raise RuntimeError(f"import {module} not found in the importtime output")
+
+# Function to list the heaviest modules imported directly by a module.
+# importtime prints a module after everything it imported, so its imports are
+# the entries between it and the previous top-level one.
+def heaviest_imports(entries, module, count=5):
+    direct = []
+    end = next(index for index, entry in enumerate(entries) if entry[:2] == (0, module))
+    for depth, name, self_us, cumulative_us in reversed(entries[:end]):
+        if depth == 0:
+            break
+        if depth == 1:
+            direct.append((cumulative_us / 1000, name))
+    return sorted(direct, reverse=True)[:count]
+
+# Function to measure every module's median import time over several runs,
+# returns {module: (median_ms, budget_ms, entries of the last run)}
+def run_startup_benchmark(budgets=STARTUP_BUDGETS, runs=5):
+    results = {}
+    for module, budget in budgets.items():
+        timings = []
+        for _ in range(runs):
+            milliseconds, entries = measure_import(module)
+            timings.append(milliseconds)
+        results[module] = (statistics.median(timings), budget, entries)
+    return results
+
+# Startup benchmark, exits with status 1 when a module goes over its budget
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the import time of the entry points against their budgets.")
+    parser.add_argument('--runs', type=int, default=5, help="imports per module, the median is reported")
+    parser.add_argument('--module', action='append', choices=sorted(STARTUP_BUDGETS),
+                        help="only check this module (repeatable)")
+    args = parser.parse_args()
+
+    budgets = {module: STARTUP_BUDGETS[module] for module in args.module or STARTUP_BUDGETS}
+    over_budget = []
+    for module, (milliseconds, budget, entries) in run_startup_benchmark(budgets, args.runs).items():
+        status = 'ok' if milliseconds <= budget else 'OVER BUDGET'
+        print(f"{module}: {milliseconds:.1f} ms (budget {budget:.0f} ms) {status}")
+        for import_ms, name in heaviest_imports(entries, module):
+            print(f"    {name}: {import_ms:.1f} ms")
+        if milliseconds > budget:
+            over_budget.append(module)
+    raise SystemExit(1 if over_budget else 0)
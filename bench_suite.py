@@ -0,0 +1,277 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# Benchmark suite for the path/row lookup, the overpass time calculation and
+# the Flask endpoints. Everything runs offline: the WRS-2 grid is a synthetic
+# one with the same tile count and overlap pattern, and scene searches are
+# answered by the LocalAPI stand-in from a generated dump.
+
+# Synthetic grid layout: 233 paths by 248 rows, rows up to 124 descending
+SYNTHETIC_PATHS = 233
+SYNTHETIC_ROWS = 248
+SYNTHETIC_DESCENDING_ROWS = 124
+
+# Sites the lookups and the endpoints are benchmarked with, and how many
+# scenes the fake API knows per site
+BENCH_SEED = 42
+BENCH_SITES = 50
+BENCH_SCENES_START = datetime(2024, 1, 1)
+BENCH_SCENES_END = datetime(2024, 10, 1)
+
+# Function to build a WRS-2-like grid: inclined, overlapping tiles about
+# 185 km wide, getting wider towards the poles like the real footprints
+def synthetic_wrs_features(path_count=SYNTHETIC_PATHS, row_count=SYNTHETIC_ROWS):
+    import numpy as np
+    import shapely
+
+    paths, rows = np.meshgrid(np.arange(1, path_count + 1), np.arange(1, row_count + 1), indexing='ij')
+    paths = paths.ravel()
+    rows = rows.ravel()
+    descending = rows <= SYNTHETIC_DESCENDING_ROWS
+
+    # Rows go around the orbit: north to south on the descending (day) side,
+    # back north on the ascending (night) side half a world away
+    theta = (rows - 1) / row_count * 2 * np.pi
+    lat = 81.8 * np.cos(theta)
+    lon = 180 - (paths - 1) * (360 / path_count) + np.where(descending, 0, 180)
+    lon = (lon + 180) % 360 - 180
+
+    half_width = 0.65 * (360 / path_count) / np.maximum(np.cos(np.radians(lat)), 0.15)
+    half_height = 1.2
+    heading = np.radians(np.where(descending, -9.0, 9.0))
+    corners = np.array([(-1, -1), (1, -1), (1, 1), (-1, 1), (-1, -1)], dtype=np.float64)
+    dx = corners[:, 0] * half_width[:, None]
+    dy = corners[:, 1] * half_height
+    x = lon[:, None] + dx * np.cos(heading)[:, None] - dy * np.sin(heading)[:, None]
+    y = lat[:, None] + dx * np.sin(heading)[:, None] + dy * np.cos(heading)[:, None]
+
+    geometries = shapely.polygons(np.stack([x, np.clip(y, -90, 90)], axis=-1))
+    modes = np.where(descending, 'D', 'A')
+    return geometries, paths, rows, modes
+
+# Function to pick benchmark sites inside the descending tiles
+def synthetic_sites(geometries, modes, count=BENCH_SITES, seed=BENCH_SEED):
+    import shapely
+
+    rng = random.Random(seed)
+    descending = [geometry for geometry, mode in zip(geometries, modes) if mode == 'D']
+    sites = []
+    while len(sites) < count:
+        centroid = shapely.centroid(rng.choice(descending))
+        lat, lon = centroid.y, centroid.x
+        if -60 <= lat <= 60 and -180 <= lon <= 180:
+            sites.append((lat, lon))
+    return sites
+
+# Function to write a scene dump LocalAPI can answer searches from: one scene
+# every 16 days over each site's tile
+def write_synthetic_scenes(dump_file, sites, grid, seed=BENCH_SEED):
+    rng = random.Random(seed)
+    scenes = []
+    for lat, lon in sites:
+        path, row = grid.lookup(lat, lon)
+        tile = grid.get_tile(path, row)
+        acquired = BENCH_SCENES_START + timedelta(days=rng.randrange(16), hours=10)
+        while acquired < BENCH_SCENES_END:
+            scenes.append({
+                'entity_id': f'LC8{path:03d}{row:03d}{acquired:%Y%j}LGN00',
+                'display_id': f'LC08_L2SP_{path:03d}{row:03d}_{acquired:%Y%m%d}_02_T1',
+                'wrs_path': path,
+                'wrs_row': row,
+                'acquisition_date': acquired.isoformat(),
+                'cloud_cover': rng.randrange(0, 10),
+                'spatial_coverage': tile.wkt,
+            })
+            acquired += timedelta(days=16)
+    with open(dump_file, 'w') as outfile:
+        json.dump(scenes, outfile)
+    return len(scenes)
+
+# Function to point the configuration at a scratch directory with the
+# synthetic grid, overpass table, scene dump and in-memory stores. Must run
+# before any of the repo modules are imported.
+def prepare_fixtures(work_dir):
+    os.environ['WRS_CACHE_DIR'] = work_dir
+    os.environ['LANDSAT_API'] = os.path.join(work_dir, 'scenes.json')
+    os.environ['SCENE_CACHE_PATH'] = ':memory:'
+    os.environ['SCENE_STORE_PATH'] = ':memory:'
+    os.environ.pop('WRS_SHA256', None)
+    os.environ.pop('OVERPASS_TABLE_PATH', None)
+
+    from wrs_cache import WRS_CACHE_FILE, write_wrs_cache
+    from wrs_grid import WRSGrid
+    from overpass_table import write_overpass_table
+
+    features = synthetic_wrs_features()
+    write_wrs_cache(*features, WRS_CACHE_FILE)
+    write_overpass_table()
+    sites = synthetic_sites(features[0], features[3])
+    scene_count = write_synthetic_scenes(os.environ['LANDSAT_API'], sites, WRSGrid.from_features(*features))
+    return sites, scene_count
+
+# Function to summarize per-call latencies (seconds) as microsecond
+# percentiles and a throughput over wall_seconds
+def summarize(latencies, wall_seconds=None):
+    ordered = sorted(latencies)
+    wall_seconds = sum(latencies) if wall_seconds is None else wall_seconds
+    return {
+        'count': len(ordered),
+        'ops_per_s': len(ordered) / wall_seconds if wall_seconds else 0.0,
+        'mean_us': statistics.fmean(ordered) * 1e6,
+        'p50_us': ordered[len(ordered) // 2] * 1e6,
+        'p99_us': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1e6,
+    }
+
+# Function to time every call of fn over a list of argument tuples
+def time_calls(fn, calls, repeat=1):
+    latencies = []
+    for _ in range(repeat):
+        for args in calls:
+            start = time.perf_counter()
+            fn(*args)
+            latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+# Function to benchmark the LandsatCalc functions
+def bench_functions(sites, repeat=200):
+    import numpy as np
+    from LandsatCalc import (calculate_time, get_covering_path_rows, get_cycle_day, get_landsat_path_row,
+                             get_landsat_path_rows, get_next_cycle_day)
+
+    now = datetime.now()
+    tiles = [get_landsat_path_row(lat, lon) + (lat, lon) for lat, lon in sites]
+    overpasses = [(path, row, get_next_cycle_day(now, get_cycle_day(path)), lat, lon) for path, row, lat, lon in tiles]
+    results = {
+        'get_landsat_path_row': time_calls(get_landsat_path_row, sites, repeat),
+        'get_covering_path_rows': time_calls(get_covering_path_rows, sites, repeat),
+        'get_cycle_day': time_calls(get_cycle_day, [(path,) for path, _, _, _ in tiles], repeat),
+        'get_next_cycle_day': time_calls(get_next_cycle_day, [(now, get_cycle_day(path)) for path, _, _, _ in tiles], repeat),
+        'calculate_time': time_calls(calculate_time, overpasses, repeat),
+    }
+
+    # Batch lookup, reported per point
+    rng = np.random.default_rng(BENCH_SEED)
+    lats = rng.uniform(-60, 60, 100000)
+    lons = rng.uniform(-180, 180, 100000)
+    latencies = []
+    for _ in range(5):
+        start = time.perf_counter()
+        get_landsat_path_rows(lats, lons)
+        latencies.append((time.perf_counter() - start) / len(lats))
+    results['get_landsat_path_rows'] = summarize(latencies)
+    return results
+
+# Function to POST payloads to an endpoint from `concurrency` threads, each
+# with its own test client, and summarize latency and throughput
+def bench_endpoint(app, url, payloads, concurrency, requests_per_thread):
+    def worker(thread):
+        client = app.test_client()
+        latencies = []
+        for n in range(requests_per_thread):
+            payload = payloads[(thread * requests_per_thread + n) % len(payloads)]
+            start = time.perf_counter()
+            response = client.post(url, json=payload)
+            response.get_data()
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise RuntimeError(f"{url} answered {response.status_code}: {response.get_data(as_text=True)}")
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = [latency for thread in executor.map(worker, range(concurrency)) for latency in thread]
+    return summarize(latencies, time.perf_counter() - start)
+
+# Function to benchmark /get_time and /get_polygons at several concurrency levels
+def bench_endpoints(sites, concurrency_levels=(1, 4, 16), requests=400):
+    from app import app
+
+    time_payloads = [{'latitude': lat, 'longitude': lon} for lat, lon in sites]
+    polygon_payloads = [dict(payload, start_date='2024-01-01', end_date='2024-10-01') for payload in time_payloads]
+
+    results = {}
+    # Warm up: the first request per tile syncs it into the scene store
+    bench_endpoint(app, '/get_time', time_payloads, 1, len(time_payloads))
+    bench_endpoint(app, '/get_polygons', polygon_payloads, 1, len(polygon_payloads))
+    for concurrency in concurrency_levels:
+        per_thread = max(1, requests // concurrency)
+        results[f'/get_time c={concurrency}'] = bench_endpoint(app, '/get_time', time_payloads, concurrency, per_thread)
+        results[f'/get_polygons c={concurrency}'] = bench_endpoint(app, '/get_polygons', polygon_payloads, concurrency, per_thread)
+    return results
+
+# Function to describe the machine and code the results come from
+def environment():
+    import numpy
+    import shapely
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': numpy.__version__,
+        'shapely': shapely.__version__,
+    }
+
+# Function to compare results against a baseline run, returns the names of
+# the benchmarks whose median latency got worse by more than tolerance
+def compare_with_baseline(results, baseline, tolerance=0.2):
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get('results', {}).get(name)
+        if before is None:
+            print(f"{name}: no baseline")
+            continue
+        change = result['p50_us'] / before['p50_us'] - 1 if before['p50_us'] else 0.0
+        flag = ''
+        if change > tolerance:
+            regressions.append(name)
+            flag = ' REGRESSION'
+        print(f"{name}: p50 {before['p50_us']:.1f} -> {result['p50_us']:.1f} us ({change:+.0%}){flag}")
+    return regressions
+
+# Run the suite, write the results as JSON and optionally compare them with a
+# previous run. Exits with status 1 when something regressed.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark lookups, overpass times and the Flask endpoints offline.")
+    parser.add_argument('--output', default='bench_results.json', help="where to write the results")
+    parser.add_argument('--baseline', help="results JSON of an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed p50 slowdown before flagging, 0.2 = 20%%")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=400, help="requests per endpoint and concurrency level")
+    parser.add_argument('--skip-endpoints', action='store_true')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        sites, scene_count = prepare_fixtures(work_dir)
+        print(f"Synthetic grid ready: {SYNTHETIC_PATHS * SYNTHETIC_ROWS} tiles, {len(sites)} sites, {scene_count} scenes.")
+
+        results = bench_functions(sites)
+        if not args.skip_endpoints:
+            results.update(bench_endpoints(sites, args.concurrency, args.requests))
+
+    for name, result in results.items():
+        print(f"{name}: {result['ops_per_s']:.0f} ops/s, p50 {result['p50_us']:.1f} us, p99 {result['p99_us']:.1f} us")
+
+    with open(args.output, 'w') as outfile:
+        json.dump({'environment': environment(), 'results': results}, outfile, indent=2)
+    print(f"Results saved to '{args.output}'.")
+
+    if args.baseline:
+        with open(args.baseline) as infile:
+            regressions = compare_with_baseline(results, json.load(infile), args.tolerance)
+        raise SystemExit(1 if regressions else 0)
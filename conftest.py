@@ -0,0 +1,15 @@
+import os
+import pytest
+from bench_suite import prepare_fixtures
+
+# The repo modules read their configuration when first imported, so tests
+# import them inside the test functions: by then this fixture has pointed the
+# configuration at the synthetic grid, overpass table and scene dump of
+# bench_suite.py. The environment is put back at the end of the session.
+@pytest.fixture(scope='session', autouse=True)
+def bench_sites(tmp_path_factory):
+    environ = dict(os.environ)
+    sites, _ = prepare_fixtures(str(tmp_path_factory.mktemp('fixtures')))
+    yield sites
+    os.environ.clear()
+    os.environ.update(environ)
@@ -0,0 +1,316 @@
+import argparse
+import json
+import os
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+import numpy as np
+from metrics import stage, timed
+from scene_api import RateLimiter
+
+# Local place-name search for the /locate endpoint. Places come from a
+# GeoNames dump (e.g. cities15000.txt from download.geonames.org/export/dump),
+# every name and alternate name of a place is normalized and kept in one
+# sorted list, so a prefix search is two bisections. Queries the gazetteer
+# can't answer go to an upstream geocoder (Nominatim by default), whose
+# answers are kept in an in-memory LRU cache with a TTL.
+
+GAZETTEER_PATH = os.environ.get('GAZETTEER_PATH', 'cities15000.txt')
+# GeoNames feature classes to keep: P is cities and villages, A is countries,
+# states and regions
+GAZETTEER_FEATURE_CLASSES = tuple(os.environ.get('GAZETTEER_FEATURE_CLASSES', 'P,A').split(','))
+GAZETTEER_MIN_POPULATION = int(os.environ.get('GAZETTEER_MIN_POPULATION', 0))
+GAZETTEER_ALTERNATE_NAMES = os.environ.get('GAZETTEER_ALTERNATE_NAMES', '1') == '1'
+
+# Upstream geocoder, set GEOCODER_URL to an empty string to stay offline
+GEOCODER_URL = os.environ.get('GEOCODER_URL', 'https://nominatim.openstreetmap.org/search')
+GEOCODER_USER_AGENT = os.environ.get('GEOCODER_USER_AGENT', 'LandsAT_finder')
+GEOCODER_TIMEOUT = float(os.environ.get('GEOCODER_TIMEOUT', 5))
+GEOCODER_CACHE_TTL = float(os.environ.get('GEOCODER_CACHE_TTL', 24 * 3600))
+GEOCODER_CACHE_SIZE = int(os.environ.get('GEOCODER_CACHE_SIZE', 10000))
+# Upstream requests per second from this process. Nominatim allows 1 per
+# second per client, so by default that is split between the worker
+# processes (WEB_CONCURRENCY, with the same default as gunicorn.conf.py).
+GEOCODER_WORKERS = int(os.environ.get('WEB_CONCURRENCY', (os.cpu_count() or 1) * 2 + 1))
+GEOCODER_RATE = float(os.environ.get('GEOCODER_RATE', 1.0 / GEOCODER_WORKERS))
+
+# GeoNames dump columns
+GEONAMES_NAME = 1
+GEONAMES_ASCII_NAME = 2
+GEONAMES_ALTERNATE_NAMES = 3
+GEONAMES_LATITUDE = 4
+GEONAMES_LONGITUDE = 5
+GEONAMES_FEATURE_CLASS = 6
+GEONAMES_COUNTRY = 8
+GEONAMES_POPULATION = 14
+
+# Function to normalize a place name for matching: accents removed, case
+# folded and whitespace collapsed, so 'São  Paulo' and 'sao paulo' match
+def normalize_name(name):
+    decomposed = unicodedata.normalize('NFKD', name)
+    return ' '.join(''.join(c for c in decomposed if not unicodedata.combining(c)).casefold().split())
+
+# Function to split an optional trailing country code off a query,
+# 'Paris, FR' becomes ('Paris', 'FR'). Whether the code is a country at all
+# ('Austin, TX') is up to the caller.
+def split_country(query):
+    name, _, country = query.rpartition(',')
+    country = country.strip()
+    if name.strip() and len(country) == 2 and country.isalpha():
+        return name.strip(), country.upper()
+    return query.strip(), None
+
+# Function to read a query that is already a coordinate pair ('45.46, 9.19')
+# Returns (lat, lon) or None.
+def parse_coordinates(query):
+    parts = query.replace(';', ',').split(',')
+    if len(parts) != 2:
+        return None
+    try:
+        lat, lon = float(parts[0]), float(parts[1])
+    except ValueError:
+        return None
+    if -90 <= lat <= 90 and -180 <= lon <= 180:
+        return lat, lon
+    return None
+
+# Raised when the upstream geocoder can't be asked within GEOCODER_TIMEOUT
+# because too many requests are queued for it
+class GeocoderBusyError(RuntimeError):
+    pass
+
+# Place names indexed as a sorted list of normalized keys, with the place
+# each key belongs to in the parallel key_places array
+class Gazetteer:
+    def __init__(self, names, countries, lats, lons, populations, keys, key_places):
+        self.names = names
+        self.countries = np.asarray(countries, dtype='U2')
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.populations = np.asarray(populations, dtype=np.int64)
+        self.country_codes = set(countries)
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.keys = [keys[i] for i in order]
+        self.key_places = np.asarray(key_places, dtype=np.int32)[order]
+
+    def __len__(self):
+        return len(self.names)
+
+    def has_country(self, country):
+        return country in self.country_codes
+
+    # Function to describe a place
+    def place(self, index):
+        return {
+            'name': self.names[index],
+            'country': str(self.countries[index]),
+            'latitude': float(self.lats[index]),
+            'longitude': float(self.lons[index]),
+            'population': int(self.populations[index]),
+        }
+
+    # Function to find the places with a name starting with the query. Exact
+    # name matches come first, then the most populated places.
+    @timed('gazetteer_search')
+    def search(self, query, limit=5, country=None):
+        key = normalize_name(query)
+        if not key:
+            return []
+        lo = bisect_left(self.keys, key)
+        hi = bisect_left(self.keys, key + '\U0010ffff', lo)
+        exact_hi = bisect_right(self.keys, key, lo, hi)
+        places = self.key_places[lo:hi]
+        exact = np.arange(lo, hi) < exact_hi
+        if country is not None:
+            in_country = self.countries[places] == country
+            places = places[in_country]
+            exact = exact[in_country]
+        if not len(places):
+            return []
+
+        # Only the best few keys are sorted, a place can match through
+        # several of its names so some spare ones are kept for the dedup
+        scores = self.populations[places] + exact * (1 << 40)
+        count = min(len(places), limit * 4)
+        best = np.argpartition(-scores, count - 1)[:count]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        results = []
+        seen = set()
+        for place in places[best].tolist():
+            if place not in seen:
+                seen.add(place)
+                results.append(self.place(place))
+                if len(results) == limit:
+                    break
+        return results
+
+    # Function to search a query as typed. A trailing ', CC' only filters
+    # when CC is one of the gazetteer's countries, 'Austin, TX' is searched
+    # as a whole.
+    def find(self, query, limit=5):
+        name, country = split_country(query)
+        if country is not None and self.has_country(country):
+            results = self.search(name, limit, country)
+            if results:
+                return results
+        return self.search(query, limit)
+
+# Function to build a gazetteer from a GeoNames dump
+@timed('gazetteer_load')
+def load_geonames(path, feature_classes=GAZETTEER_FEATURE_CLASSES, min_population=GAZETTEER_MIN_POPULATION,
+                  alternate_names=GAZETTEER_ALTERNATE_NAMES):
+    names, countries, lats, lons, populations = [], [], [], [], []
+    keys, key_places = [], []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) <= GEONAMES_POPULATION or fields[GEONAMES_FEATURE_CLASS] not in feature_classes:
+                continue
+            population = int(fields[GEONAMES_POPULATION] or 0)
+            if population < min_population:
+                continue
+
+            place = len(names)
+            names.append(fields[GEONAMES_NAME])
+            countries.append(fields[GEONAMES_COUNTRY])
+            lats.append(float(fields[GEONAMES_LATITUDE]))
+            lons.append(float(fields[GEONAMES_LONGITUDE]))
+            populations.append(population)
+
+            place_names = [fields[GEONAMES_NAME], fields[GEONAMES_ASCII_NAME]]
+            if alternate_names and fields[GEONAMES_ALTERNATE_NAMES]:
+                place_names.extend(fields[GEONAMES_ALTERNATE_NAMES].split(','))
+            for key in {normalize_name(name) for name in place_names}:
+                if key:
+                    keys.append(key)
+                    key_places.append(place)
+    return Gazetteer(names, countries, lats, lons, populations, keys, key_places)
+
+_gazetteer = None
+_gazetteer_loaded = False
+_gazetteer_lock = threading.Lock()
+
+# Function to get the process-wide gazetteer, loaded on first use. None if
+# GAZETTEER_PATH doesn't exist, then every search goes upstream.
+def get_gazetteer():
+    global _gazetteer, _gazetteer_loaded
+    if _gazetteer_loaded:
+        return _gazetteer
+
+    with _gazetteer_lock:
+        if not _gazetteer_loaded:
+            if os.path.exists(GAZETTEER_PATH):
+                _gazetteer = load_geonames(GAZETTEER_PATH)
+            _gazetteer_loaded = True
+    return _gazetteer
+
+# In-memory LRU cache whose entries also expire after `ttl` seconds
+class TTLCache:
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # Function to get a live entry, or None
+    def get(self, key):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+_upstream_cache = TTLCache(GEOCODER_CACHE_SIZE, GEOCODER_CACHE_TTL)
+_upstream_limiter = RateLimiter(GEOCODER_RATE)
+
+# Function to ask the upstream geocoder, answers (empty ones too) are cached.
+# Requests are spaced out to GEOCODER_RATE per second, one whose turn is more
+# than GEOCODER_TIMEOUT away raises GeocoderBusyError instead of waiting. A
+# failed request returns no results and isn't cached.
+def search_upstream(query, limit=5):
+    key = (normalize_name(query), limit)
+    results = _upstream_cache.get(key)
+    if results is not None:
+        return results
+
+    import urllib.error
+    import urllib.parse
+    import urllib.request
+
+    params = {'format': 'jsonv2', 'q': query, 'limit': limit}
+    request = urllib.request.Request(GEOCODER_URL + '?' + urllib.parse.urlencode(params),
+                                     headers={'User-Agent': GEOCODER_USER_AGENT})
+    if not _upstream_limiter.wait(GEOCODER_TIMEOUT):
+        raise GeocoderBusyError('The upstream geocoder is busy, try again later.')
+    try:
+        with stage('geocoder_upstream'), urllib.request.urlopen(request, timeout=GEOCODER_TIMEOUT) as response:
+            places = json.load(response)
+    except (OSError, ValueError) as e:
+        print(f"Geocoder request for '{query}' failed: {e}")
+        return []
+
+    results = [
+        {'name': place.get('display_name', query), 'country': None,
+         'latitude': float(place['lat']), 'longitude': float(place['lon']), 'population': None}
+        for place in places
+    ]
+    _upstream_cache.put(key, results)
+    return results
+
+# Function to resolve a query to places: a coordinate pair as is, then the
+# local gazetteer, then the upstream geocoder. Returns (source, results).
+def geocode(query, limit=5, upstream=True):
+    coordinates = parse_coordinates(query)
+    if coordinates is not None:
+        lat, lon = coordinates
+        return 'coordinates', [{'name': query.strip(), 'country': None, 'latitude': lat, 'longitude': lon, 'population': None}]
+
+    gazetteer = get_gazetteer()
+    if gazetteer is not None:
+        results = gazetteer.find(query, limit)
+        if results:
+            return 'gazetteer', results
+    if upstream and GEOCODER_URL:
+        return 'upstream', search_upstream(query.strip(), limit)
+    return 'gazetteer', []
+
+# Function to get the hit/miss counters of the gazetteer and upstream cache
+def geocoder_stats():
+    gazetteer = get_gazetteer()
+    return {'places': len(gazetteer) if gazetteer is not None else 0, 'upstream_cache': _upstream_cache.stats()}
+
+# Try queries against a GeoNames dump from the command line
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search the local gazetteer.")
+    parser.add_argument('queries', nargs='+')
+    parser.add_argument('--path', default=GAZETTEER_PATH)
+    parser.add_argument('--limit', type=int, default=5)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    gazetteer = load_geonames(args.path)
+    print(f"{len(gazetteer)} places, {len(gazetteer.keys)} names loaded in {time.perf_counter() - start:.2f} s.")
+    for query in args.queries:
+        for place in gazetteer.find(query, args.limit):
+            print(f"{query}: {place['name']} ({place['country']}) {place['latitude']}, {place['longitude']}")
@@ -0,0 +1,79 @@
+import os
+import zlib
+
+# Content encodings we can produce, in order of preference
+try:
+    import brotli
+    STREAM_ENCODINGS = ('br', 'gzip')
+except ImportError:
+    brotli = None
+    STREAM_ENCODINGS = ('gzip',)
+
+# Flush the compressor every this many chunks (features), so the client gets
+# them while the rest is still being read instead of in one block at the end
+STREAM_FLUSH_CHUNKS = int(os.environ.get('STREAM_FLUSH_CHUNKS', 100))
+
+# Function to convert a scene into a GeoJSON feature. tolerance simplifies the
+# footprint with Douglas-Peucker, precision rounds the coordinates to that many
+# decimals.
+def scene_feature(scene, precision=None, tolerance=None):
+    import shapely
+    from shapely.geometry import mapping
+    from shapely.wkt import loads
+
+    polygon = scene['spatial_coverage']
+    if isinstance(polygon, str):
+        polygon = loads(polygon)
+    if tolerance:
+        polygon = polygon.simplify(tolerance, preserve_topology=False)
+    if precision is not None:
+        polygon = shapely.set_precision(polygon, 10.0 ** -precision)
+    return {
+        "type": "Feature",
+        "geometry": mapping(polygon),
+        "properties": {
+            "scene_id": scene["entity_id"],
+            "acquisition_date": scene["acquisition_date"],
+            "cloud_cover": scene["cloud_cover"],
+        }
+    }
+
+# Function to serialize a FeatureCollection one feature at a time
+def iter_feature_collection(features, dumps):
+    yield '{"type": "FeatureCollection", "features": ['
+    separator = ''
+    for feature in features:
+        yield separator + dumps(feature)
+        separator = ', '
+    yield ']}'
+
+# Function to pick the response encoding from the request's Accept-Encoding,
+# None means send it uncompressed
+def negotiate_encoding(accept_encodings):
+    for encoding in STREAM_ENCODINGS:
+        if accept_encodings[encoding]:
+            return encoding
+    return None
+
+# Function to compress a stream of text chunks on the fly, flushing every
+# flush_every chunks
+def compress_chunks(chunks, encoding, flush_every=STREAM_FLUSH_CHUNKS):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=5)
+        compress, flush, finish = compressor.process, compressor.flush, compressor.finish
+    elif encoding == 'gzip':
+        compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        compress, finish = compressor.compress, compressor.flush
+        flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+    else:
+        for chunk in chunks:
+            yield chunk.encode()
+        return
+
+    for count, chunk in enumerate(chunks, 1):
+        data = compress(chunk.encode())
+        if count % flush_every == 0:
+            data += flush()
+        if data:
+            yield data
+    yield finish()
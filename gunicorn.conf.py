@@ -0,0 +1,27 @@
+import os
+
+# Production serving: gunicorn -c gunicorn.conf.py
+# The app and its WRS-2 index, overpass table and timezone data are loaded
+# once in the master (see wsgi.py) and shared by the forked workers.
+wsgi_app = 'wsgi:application'
+preload_app = True
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', (os.cpu_count() or 1) * 2 + 1))
+
+# The scene search route spends its time waiting on the USGS API, so each
+# worker runs several threads. GUNICORN_WORKER_CLASS=gevent switches to
+# greenlets instead (gevent must be installed).
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers now and then so slow leaks can't build up
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+accesslog = os.environ.get('GUNICORN_ACCESSLOG') or None
+errorlog = '-'
@@ -1,11 +1,14 @@
+import argparse
+import csv
 import json
-import schedule
 import time
-from landsatxplore.api import API
-from datetime import datetime, timedelta
-from LandsatCalc import get_landsat_path_row
-from shapely.wkt import loads
-import matplotlib.pyplot as plt
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from alert_scheduler import AlertScheduler
+from datetime import datetime
+from LandsatCalc import get_landsat_path_row, get_landsat_path_rows
+from scene_api import RateLimiter, get_api_pool
+from scene_cache import cached_search
+from wrs_grid import NO_TILE, get_wrs_grid
 
 # Function to convert various object types to string
 def custom_json_serial(obj):
@@ -16,9 +19,9 @@ def custom_json_serial(obj):
     raise TypeError(f"Type {obj.__class__.__name__} not serializable")
 
 # Function to search for Landsat scenes and fetch metadata
-def search_landsat_scenes(lat, lon, start_date, end_date):
-    api = API('samahosam', 'Sasosaso@2022')
-
+# summary_path/png_path optionally save a footprint summary table (CSV) and a
+# rendered plot of all footprints
+def search_landsat_scenes(lat, lon, start_date, end_date, summary_path=None, png_path=None):
     # Get the path and row for the given coordinates
     path, row = get_landsat_path_row(lat, lon)
     
@@ -28,68 +31,152 @@ def search_landsat_scenes(lat, lon, start_date, end_date):
     
     print(f"Path: {path}, Row: {row}")
     
-    # Search for Landsat scenes using the path and row
-    scenes = api.search(
-        dataset='landsat_ot_c2_l2',
-        latitude=lat,
-        longitude=lon,
+    # Search for Landsat scenes using the path and row, repeated searches are
+    # answered from the scene cache
+    scenes = cached_search(
+        lat, lon, path, row,
         start_date=start_date,
         end_date=end_date,
+        dataset='landsat_ot_c2_l2',
         max_cloud_cover=10
     )
     
     print(f"{len(scenes)} scenes found.")
-   
-    scene_data = []
-    for scene in scenes:
-        # Load the polygon using Shapely
-        print()
-        #wkt_string = "POLYGON ((-6.43793 49.64714, -3.88869 49.19698, -3.11761 50.89143, -5.75664 51.34855, -6.43793 49.64714))"
-        wkt_string = str(scene['spatial_coverage'])
-        polygon = loads(wkt_string)
-
-        # Get properties
-        centroid = polygon.centroid
-        area = polygon.area
-        perimeter = polygon.length
-
-        # Print properties
-        print(f"Centroid: {centroid}")
-        print(f"Area: {area}")
-        print(f"Perimeter: {perimeter}")
-
-        # Plot the polygon using Matplotlib
-        x, y = polygon.exterior.xy
-        plt.plot(x, y)
-        plt.scatter(centroid.x, centroid.y, color='red')  # Plot centroid
-        plt.title("Polygon Visualization with Centroid")
-        plt.show()
-
-    api.logout()
+
+    # Centroid, area, perimeter and tile overlap of all footprints in one pass
+    from scene_analytics import analyze_footprints, render_footprints, write_summary
+
+    tile = get_wrs_grid().get_tile(path, row)
+    table = analyze_footprints(scenes, tile)
+    if summary_path:
+        write_summary(table, summary_path)
+        print(f"Footprint summary saved to '{summary_path}'.")
+    if png_path:
+        render_footprints(table, png_path, tile, (lat, lon))
+        print(f"Footprint plot saved to '{png_path}'.")
+
     return scenes # Return the list of dictionaries containing scene data
 
+# Function to search every scene of a WRS-2 tile, retrying failed searches
+# with exponential backoff
+def search_tile_scenes(path, row, start_date, end_date, dataset='landsat_ot_c2_l2', max_cloud_cover=10,
+                       limiter=None, retries=3, backoff=1.0):
+    tile = get_wrs_grid().get_tile(path, row)
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.wait()
+        try:
+            return get_api_pool().call(lambda api: api.search(
+                dataset=dataset,
+                bbox=tile.bounds,
+                start_date=start_date,
+                end_date=end_date,
+                max_cloud_cover=max_cloud_cover,
+                max_results=10000
+            ))
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+# Function to search scenes for many sites at once. Sites are grouped by
+# WRS-2 tile so each tile is searched upstream only once, the tile searches
+# run concurrently, and one result per site is yielded as soon as its tile
+# completes (not in input order).
+def batch_search_landsat_scenes(sites, start_date, end_date, dataset='landsat_ot_c2_l2', max_cloud_cover=10,
+                                concurrency=8, rate=None, retries=3):
+    lats = [float(lat) for lat, lon in sites]
+    lons = [float(lon) for lat, lon in sites]
+    paths, rows = get_landsat_path_rows(lats, lons)
+
+    tiles = {}
+    for site, (path, row) in enumerate(zip(paths.tolist(), rows.tolist())):
+        if path == NO_TILE:
+            yield {'site': site, 'latitude': lats[site], 'longitude': lons[site],
+                   'path': None, 'row': None, 'scenes': []}
+        else:
+            tiles.setdefault((path, row), []).append(site)
+
+    from shapely import Point
+
+    limiter = RateLimiter(rate)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(search_tile_scenes, path, row, start_date, end_date, dataset,
+                            max_cloud_cover, limiter, retries): (path, row)
+            for path, row in tiles
+        }
+        for future in as_completed(futures):
+            path, row = futures[future]
+            try:
+                scenes = future.result()
+                error = None
+            except Exception as e:
+                scenes = []
+                error = str(e)
+
+            # The tile search returns every scene touching the tile, keep the
+            # ones covering each site
+            for site in tiles[(path, row)]:
+                result = {'site': site, 'latitude': lats[site], 'longitude': lons[site], 'path': path, 'row': row}
+                if error is not None:
+                    result['error'] = error
+                point = Point(lons[site], lats[site])
+                result['scenes'] = [scene for scene in scenes if scene['spatial_coverage'].intersects(point)]
+                yield result
+
+# Function to read (latitude, longitude) sites from a CSV file
+def read_sites(csv_path, lat_column='latitude', lon_column='longitude'):
+    with open(csv_path, newline='') as infile:
+        return [(float(record[lat_column]), float(record[lon_column])) for record in csv.DictReader(infile)]
+
 # Function to send a notification
 def send_notification(date):
     print(f"Reminder: Landsat satellite will overpass on {date}.")
 
-# Function to schedule notifications
-def schedule_notification(lat, lon, target_date):
-    # Schedule the notification for a day before the target date
-    notification_date = target_date - timedelta(days=1)
-    schedule.every().day.at("09:00").do(send_notification, notification_date)
-
-    while True:
-        schedule.run_pending()
-        time.sleep(60)  # Wait a minute before checking again
+# Function to schedule overpass notifications for a site. Alerts go out once
+# per overpass, a day ahead, from the timer-heap scheduler in
+# alert_scheduler.py. target_date, if given, is used as the first overpass.
+# Blocks while the scheduler runs.
+def schedule_notification(lat, lon, target_date=None):
+    scheduler = AlertScheduler(sinks=[lambda site_id, lat, lon, overpass_time: send_notification(overpass_time)])
+    scheduler.subscribe(f"{lat},{lon}", lat, lon, target_date)
+    scheduler.run_forever()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search Landsat scenes for one or many sites.")
+    parser.add_argument('--sites', metavar='CSV', help="search every site of a CSV with latitude/longitude columns")
+    parser.add_argument('--output', default='-', help="JSON lines output for --sites, '-' for stdout")
+    parser.add_argument('--start-date', default='2024-01-01')
+    parser.add_argument('--end-date', default='2024-10-01')
+    parser.add_argument('--max-cloud-cover', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, default=8, help="number of tile searches in flight")
+    parser.add_argument('--rate', type=float, default=None, help="max upstream searches started per second")
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--summary', metavar='CSV', help="save a footprint summary table of the example search")
+    parser.add_argument('--png', help="save a plot of the example search's footprints")
+    args = parser.parse_args()
+
+    if args.sites:
+        sites = read_sites(args.sites)
+        outfile = open(args.output, 'w') if args.output != '-' else None
+        start = time.perf_counter()
+        for result in batch_search_landsat_scenes(sites, args.start_date, args.end_date,
+                                                  max_cloud_cover=args.max_cloud_cover, concurrency=args.concurrency,
+                                                  rate=args.rate, retries=args.retries):
+            print(json.dumps(result, default=custom_json_serial), file=outfile, flush=True)
+        if outfile is not None:
+            outfile.close()
+            print(f"{len(sites)} sites searched in {time.perf_counter() - start:.2f} s.")
+        raise SystemExit(0)
+
     latitude = 50.85
     longitude = -4.35
-    start_date = '2024-01-01'
-    end_date = '2024-10-01'
+    start_date = args.start_date
+    end_date = args.end_date
     
     # Search for Landsat scenes
-    scenes_data = search_landsat_scenes(latitude, longitude, start_date, end_date)
+    scenes_data = search_landsat_scenes(latitude, longitude, start_date, end_date, args.summary, args.png)
     
     if scenes_data:
         # Save the scene data to a JSON-formatted text file
@@ -0,0 +1,165 @@
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlencode
+
+# Load test of the production setup: starts gunicorn (gunicorn.conf.py) on
+# the synthetic grid and scene dump of bench_suite.py with 1, 2, 4... workers
+# and reports requests per second and latency at each worker count.
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Function to find a free local port
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+# Function to start gunicorn and wait until it answers
+def start_server(port, workers, threads, worker_class, timeout=60):
+    env = dict(os.environ, BIND=f'127.0.0.1:{port}', WEB_CONCURRENCY=str(workers),
+               GUNICORN_THREADS=str(threads), GUNICORN_WORKER_CLASS=worker_class)
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'], cwd=REPO_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {server.returncode}")
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/about')
+            connection.getresponse().read()
+            connection.close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("gunicorn didn't start in time")
+
+def stop_server(server):
+    server.terminate()
+    server.wait()
+
+# Function to turn a route and a site into (method, url, body, headers)
+def build_request(route, lat, lon):
+    if route == 'get_time':
+        return 'GET', '/get_time?' + urlencode({'latitude': lat, 'longitude': lon}), None, {}
+    body = json.dumps({'latitude': lat, 'longitude': lon, 'start_date': '2024-01-01', 'end_date': '2024-10-01'})
+    return 'POST', '/get_polygons', body, {'Content-Type': 'application/json'}
+
+# Client process: `connections` threads each send requests over a keep-alive
+# connection for `duration` seconds. Returns (latencies, errors).
+def run_client(port, route, sites, connections, duration, offset):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(thread):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local = []
+        n = offset + thread
+        while time.monotonic() < deadline:
+            method, url, body, headers = build_request(route, *sites[n % len(sites)])
+            n += connections
+            start = time.perf_counter()
+            try:
+                connection.request(method, url, body, headers)
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                ok = False
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            if ok:
+                local.append(time.perf_counter() - start)
+            else:
+                with lock:
+                    errors[0] += 1
+        connection.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(thread,)) for thread in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0]
+
+# Function to request every site once, so each tile is synced into the
+# scene store before the measurement
+def warm_up(port, route, sites):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    for lat, lon in sites:
+        method, url, body, headers = build_request(route, lat, lon)
+        connection.request(method, url, body, headers)
+        connection.getresponse().read()
+    connection.close()
+
+# Function to load one route from `clients` processes and summarize it
+def run_load(port, route, sites, clients, connections, duration):
+    from bench_suite import summarize
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=clients) as executor:
+        futures = [executor.submit(run_client, port, route, sites, connections, duration, client * connections)
+                   for client in range(clients)]
+        results = [future.result() for future in futures]
+    wall_seconds = time.perf_counter() - start
+    latencies = [latency for client_latencies, _ in results for latency in client_latencies]
+    if not latencies:
+        raise RuntimeError(f"every /{route} request failed")
+    summary = summarize(latencies, wall_seconds)
+    summary['errors'] = sum(errors for _, errors in results)
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test gunicorn at several worker counts.")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--routes', nargs='+', default=['get_time', 'get_polygons'], choices=['get_time', 'get_polygons'])
+    parser.add_argument('--threads', type=int, default=8, help="threads per gunicorn worker")
+    parser.add_argument('--worker-class', default='gthread')
+    parser.add_argument('--clients', type=int, default=2, help="load generator processes")
+    parser.add_argument('--connections', type=int, default=8, help="keep-alive connections per client process")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per route and worker count")
+    parser.add_argument('--output', default='loadtest_results.json')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        from bench_suite import environment, prepare_fixtures
+
+        # Every gunicorn started below inherits the fixture configuration,
+        # the workers share the scene store and cache files like in production
+        sites, scene_count = prepare_fixtures(work_dir)
+        os.environ['SCENE_STORE_PATH'] = os.path.join(work_dir, 'scene_store.sqlite3')
+        os.environ['SCENE_CACHE_PATH'] = os.path.join(work_dir, 'scene_cache.sqlite3')
+        print(f"Fixtures ready: {len(sites)} sites, {scene_count} scenes, {os.cpu_count()} CPUs.")
+
+        results = {}
+        for workers in args.workers:
+            port = free_port()
+            server = start_server(port, workers, args.threads, args.worker_class)
+            try:
+                for route in args.routes:
+                    warm_up(port, route, sites)
+                    summary = run_load(port, route, sites, args.clients, args.connections, args.duration)
+                    results[f'/{route} workers={workers}'] = summary
+                    print(f"/{route} with {workers} workers: {summary['ops_per_s']:.0f} req/s, "
+                          f"p50 {summary['p50_us'] / 1000:.2f} ms, p99 {summary['p99_us'] / 1000:.2f} ms, "
+                          f"{summary['errors']} errors")
+            finally:
+                stop_server(server)
+
+    with open(args.output, 'w') as outfile:
+        json.dump({'environment': environment(), 'cpus': os.cpu_count(), 'results': results}, outfile, indent=2)
+    print(f"Results saved to '{args.output}'.")
@@ -0,0 +1,233 @@
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from functools import wraps
+
+# METRICS_ENABLED=0 turns the stage timers into no-ops, SERVER_TIMING=1 adds
+# a Server-Timing header with the stage timings to every response, and
+# PROFILER_ENABLED=1 exposes the sampling profiler over HTTP
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '0') == '1'
+PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', '0') == '1'
+PROFILER_INTERVAL = float(os.environ.get('PROFILER_INTERVAL', 0.005))
+
+# Histogram bucket upper bounds in seconds, from the microsecond lookups up
+# to shapefile downloads
+METRIC_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                  0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_HELP = {
+    'landsat_stage_seconds': 'Time spent in each processing stage.',
+    'landsat_request_seconds': 'Time to answer a request, up to the response headers.',
+}
+
+# Latency histogram with fixed buckets, like a Prometheus histogram
+class Histogram:
+    def __init__(self, buckets=METRIC_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    # Return (cumulative bucket counts, sum, count)
+    def snapshot(self):
+        with self.lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        cumulative = []
+        running = 0
+        for bucket_count in counts:
+            running += bucket_count
+            cumulative.append(running)
+        return cumulative, total, count
+
+# (metric name, sorted label items) -> Histogram
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+def get_histogram(name, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    histogram = _histograms.get(key)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(key, Histogram())
+    return histogram
+
+def observe(name, seconds, **labels):
+    get_histogram(name, **labels).observe(seconds)
+
+# Stage name -> its landsat_stage_seconds histogram, so timing a stage costs
+# one dict lookup rather than building the label key every time
+_stage_histograms = {}
+
+def get_stage_histogram(name):
+    histogram = _stage_histograms.get(name)
+    if histogram is None:
+        histogram = _stage_histograms.setdefault(name, get_histogram('landsat_stage_seconds', stage=name))
+    return histogram
+
+# Stage timings of the request being handled by this thread, if it collects them
+_request = threading.local()
+
+def _record_stage(name, histogram, elapsed):
+    histogram.observe(elapsed)
+    timings = getattr(_request, 'timings', None)
+    if timings is not None:
+        timings.append((name, elapsed))
+
+# Timer for one processing stage, as a context manager:
+#     with stage('wrs_lookup'):
+#         ...
+# The duration goes into the landsat_stage_seconds histogram and, when the
+# thread is collecting them, into the current request's Server-Timing list.
+class stage:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if not METRICS_ENABLED:
+            return False
+        elapsed = time.perf_counter() - self.start
+        _record_stage(self.name, get_stage_histogram(self.name), elapsed)
+        return False
+
+# Decorator timing every call of a function as a stage
+def timed(name):
+    def decorator(fn):
+        if not METRICS_ENABLED:
+            return fn
+        histogram = get_stage_histogram(name)
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _record_stage(name, histogram, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+# Start collecting the stage timings of the request handled by this thread
+def begin_request():
+    _request.timings = []
+
+# Stop collecting and return the (stage, seconds) pairs seen since begin_request
+def end_request():
+    timings = getattr(_request, 'timings', None) or []
+    _request.timings = None
+    return timings
+
+# Function to format stage timings as a Server-Timing header value, repeated
+# stages are added up
+def server_timing_header(timings):
+    totals = {}
+    for name, seconds in timings:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ', '.join(f'{name};dur={seconds * 1000:.3f}' for name, seconds in totals.items())
+
+# Function to render every histogram in the Prometheus text format
+def render_metrics():
+    with _histograms_lock:
+        histograms = sorted(_histograms.items())
+
+    lines = []
+    previous_name = None
+    for (name, labels), histogram in histograms:
+        if name != previous_name:
+            lines.append(f'# HELP {name} {METRIC_HELP.get(name, name)}')
+            lines.append(f'# TYPE {name} histogram')
+            previous_name = name
+        label_text = ','.join(f'{key}="{value}"' for key, value in labels)
+        separator = ',' if label_text else ''
+        cumulative, total, count = histogram.snapshot()
+        for bound, bucket_count in zip(histogram.buckets + ('+Inf',), cumulative):
+            lines.append(f'{name}_bucket{{{label_text}{separator}le="{bound}"}} {bucket_count}')
+        lines.append(f'{name}_sum{{{label_text}}} {total}')
+        lines.append(f'{name}_count{{{label_text}}} {count}')
+    return '\n'.join(lines) + '\n'
+
+# Sampling profiler that can be switched on in a running process: a thread
+# records the stack of every other thread every `interval` seconds, and the
+# samples come out in the collapsed format flamegraph tools read
+class SamplingProfiler:
+    def __init__(self, interval=PROFILER_INTERVAL, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = Counter()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, interval=None):
+        if self.running:
+            return
+        if interval:
+            self.interval = interval
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                names = []
+                while frame is not None and len(names) < self.max_depth:
+                    code = frame.f_code
+                    names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                    frame = frame.f_back
+                stacks.append(';'.join(reversed(names)))
+            with self.lock:
+                self.samples.update(stacks)
+
+    # Samples as 'outer;...;inner count' lines, most frequent first
+    def collapsed(self):
+        with self.lock:
+            samples = self.samples.most_common()
+        return '\n'.join(f'{stack} {count}' for stack, count in samples) + '\n'
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+# Function to get the process-wide sampling profiler (not started)
+def get_profiler():
+    global _profiler
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = SamplingProfiler()
+    return _profiler
@@ -0,0 +1,103 @@
+import argparse
+import os
+import threading
+import numpy as np
+from wrs_cache import WRS_CACHE_DIR, _atomic_write, load_wrs_features
+
+# Where the prebuilt overpass table lives. Rebuild it (python overpass_table.py)
+# whenever the WRS-2 shapefile or the cycle day table changes.
+OVERPASS_TABLE_VERSION = 1
+OVERPASS_TABLE_PATH = os.environ.get(
+    'OVERPASS_TABLE_PATH', os.path.join(WRS_CACHE_DIR, f'overpass_table.v{OVERPASS_TABLE_VERSION}.npy'))
+
+# The table is indexed directly as table[mode, path, row]
+OVERPASS_MODES = ('D', 'A')
+WRS_ROW_COUNT = 248
+
+# Function to build the record type, timezone names are stored fixed-width
+# so every record has the same size and the file can be memory-mapped
+def overpass_dtype(timezone_width):
+    return np.dtype([
+        ('path', 'i2'),
+        ('row', 'i2'),
+        ('cycle_day', 'i1'),         # 0 means no such tile or an unscheduled path
+        ('index_in_day', 'i1'),
+        ('minutes', 'f8'),           # time into the cycle day, as calculate_time computes it
+        ('timezone', f'S{timezone_width}'),
+    ])
+
+# Function to precompute the overpass record of every WRS-2 tile. The
+# timezone of a tile is the one at its centroid.
+def build_overpass_table(geometries, paths, rows, modes):
+    import shapely
+    from LandsatCalc import PATH_CYCLE_DAY, PATH_INDEX_IN_DAY, TIME_PER_PATH, TIME_PER_ROW, WRS_PATH_COUNT
+    from timezones import get_timezone_name
+
+    centroids = shapely.centroid(np.asarray(geometries, dtype=object))
+    timezones = [get_timezone_name(lat, lon) for lon, lat in shapely.get_coordinates(centroids)]
+    table = np.zeros((len(OVERPASS_MODES), WRS_PATH_COUNT + 1, WRS_ROW_COUNT + 1),
+                     dtype=overpass_dtype(max(map(len, timezones), default=1)))
+
+    for path, row, mode, timezone in zip(np.asarray(paths).tolist(), np.asarray(rows).tolist(), modes, timezones):
+        if mode not in OVERPASS_MODES or not (1 <= path <= WRS_PATH_COUNT and 1 <= row <= WRS_ROW_COUNT):
+            continue
+        record = table[OVERPASS_MODES.index(mode), path, row]
+        if record['path']:
+            continue  # Tiles repeated in the shapefile, keep the first one like the grid does
+        record['path'] = path
+        record['row'] = row
+        record['cycle_day'] = PATH_CYCLE_DAY[path]
+        record['index_in_day'] = PATH_INDEX_IN_DAY[path]
+        record['minutes'] = int(PATH_INDEX_IN_DAY[path]) * TIME_PER_PATH + row * TIME_PER_ROW
+        record['timezone'] = timezone.encode()
+    return table
+
+# Function to build the table from the WRS-2 cache and save it as .npy
+def write_overpass_table(table_path=OVERPASS_TABLE_PATH):
+    table = build_overpass_table(*load_wrs_features())
+    _atomic_write(table_path, lambda f: np.save(f, table))
+    return table
+
+# Function to open the table read-only and memory-mapped, so every worker
+# process shares the same pages. Returns None if it hasn't been built.
+def load_overpass_table(table_path=OVERPASS_TABLE_PATH):
+    if not os.path.exists(table_path):
+        return None
+    return np.load(table_path, mmap_mode='r')
+
+_table = None
+_table_loaded = False
+_table_lock = threading.Lock()
+
+# Function to get the process-wide table, opened on first use (None if it
+# hasn't been built)
+def get_overpass_table():
+    global _table, _table_loaded
+    if _table_loaded:
+        return _table
+
+    with _table_lock:
+        if not _table_loaded:
+            _table = load_overpass_table()
+            _table_loaded = True
+    return _table
+
+# Function to get the record of a tile, or None if the table has no such tile
+def overpass_record(table, path, row, mode='D'):
+    if mode not in OVERPASS_MODES:
+        return None
+    _, path_count, row_count = table.shape
+    if not (0 < path < path_count and 0 < row < row_count):
+        return None
+    record = table[OVERPASS_MODES.index(mode), path, row]
+    return record if record['cycle_day'] else None
+
+# Offline build step, run once after the WRS-2 cache is in place
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute the per-tile overpass lookup table.")
+    parser.add_argument('--output', default=OVERPASS_TABLE_PATH)
+    args = parser.parse_args()
+
+    table = write_overpass_table(args.output)
+    print(f"Overpass table written to {args.output}: {int((table['cycle_day'] > 0).sum())} tiles, "
+          f"{table.nbytes / 1e6:.1f} MB.")
@@ -0,0 +1,107 @@
+import csv
+import numpy as np
+import shapely
+
+# Mean Earth radius in metres, used for the spherical (geodesic) measures
+EARTH_RADIUS = 6371008.8
+
+SUMMARY_COLUMNS = (
+    'entity_id', 'acquisition_date', 'cloud_cover', 'centroid_lon', 'centroid_lat',
+    'area_deg2', 'area_km2', 'perimeter_deg', 'perimeter_km', 'tile_overlap',
+)
+
+# Function to turn the scenes' spatial_coverage (shapely polygons, WKT strings
+# or WKB bytes) into one array of geometries
+def parse_footprints(scenes):
+    coverages = [scene['spatial_coverage'] for scene in scenes]
+    if not coverages:
+        return np.empty(0, dtype=object)
+    if isinstance(coverages[0], bytes):
+        return shapely.from_wkb(coverages)
+    if isinstance(coverages[0], str):
+        return shapely.from_wkt(coverages)
+    # Already geometries: round-trip through WKB in one vectorized pass to
+    # get a clean array of shapely 2.x objects
+    return shapely.from_wkb(shapely.to_wkb(np.asarray(coverages, dtype=object)))
+
+# Function to sum a value over consecutive vertex pairs of each polygon's exterior ring
+def _ring_pair_sums(polygons, pair_values):
+    coords, index = shapely.get_coordinates(shapely.get_exterior_ring(polygons), return_index=True)
+    lon = np.radians(coords[:, 0])
+    lat = np.radians(coords[:, 1])
+    values = pair_values(lon[:-1], lat[:-1], lon[1:], lat[1:])
+    # Pairs that straddle two rings don't count
+    values = np.where(index[1:] == index[:-1], values, 0.0)
+    return np.bincount(index[:-1], weights=values, minlength=len(polygons))
+
+# Function to compute polygon areas on the sphere in square metres
+def geodesic_areas(polygons):
+    if len(polygons) == 0:
+        return np.empty(0)
+    sums = _ring_pair_sums(polygons, lambda lon1, lat1, lon2, lat2: (lon2 - lon1) * (2 + np.sin(lat1) + np.sin(lat2)))
+    return np.abs(sums) * EARTH_RADIUS ** 2 / 2
+
+# Function to compute polygon perimeters on the sphere in metres (haversine)
+def geodesic_perimeters(polygons):
+    if len(polygons) == 0:
+        return np.empty(0)
+
+    def haversine(lon1, lat1, lon2, lat2):
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+    return _ring_pair_sums(polygons, haversine)
+
+# Function to compute the summary table of a batch of scenes in one pass.
+# tile is the query point's WRS-2 tile polygon, tile_overlap is the share of
+# each footprint inside it. Returns a dict of equal-length columns.
+def analyze_footprints(scenes, tile=None):
+    polygons = parse_footprints(scenes)
+    centroids = shapely.centroid(polygons)
+    areas = shapely.area(polygons)
+    if tile is not None:
+        overlap = shapely.area(shapely.intersection(polygons, tile))
+        tile_overlap = np.divide(overlap, areas, out=np.zeros_like(areas), where=areas > 0)
+    else:
+        tile_overlap = np.full(len(polygons), np.nan)
+
+    return {
+        'entity_id': [scene.get('entity_id') for scene in scenes],
+        'acquisition_date': [scene.get('acquisition_date') for scene in scenes],
+        'cloud_cover': [scene.get('cloud_cover') for scene in scenes],
+        'centroid_lon': shapely.get_x(centroids),
+        'centroid_lat': shapely.get_y(centroids),
+        'area_deg2': areas,
+        'area_km2': geodesic_areas(polygons) / 1e6,
+        'perimeter_deg': shapely.length(polygons),
+        'perimeter_km': geodesic_perimeters(polygons) / 1e3,
+        'tile_overlap': tile_overlap,
+        'geometry': polygons,
+    }
+
+# Function to write the summary table as CSV
+def write_summary(table, csv_path):
+    with open(csv_path, 'w', newline='') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(SUMMARY_COLUMNS)
+        writer.writerows(zip(*(table[column] for column in SUMMARY_COLUMNS)))
+
+# Function to render every footprint and its centroid into one PNG, without a display
+def render_footprints(table, png_path, tile=None, point=None):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+
+    rings = [np.asarray(polygon.exterior.coords) for polygon in table['geometry']]
+    fig, ax = plt.subplots(figsize=(8, 8))
+    ax.add_collection(LineCollection(rings, linewidths=0.8))
+    ax.scatter(table['centroid_lon'], table['centroid_lat'], color='red', s=6)  # Plot centroids
+    if tile is not None:
+        ax.plot(*tile.exterior.xy, color='black', linestyle='--', linewidth=1)
+    if point is not None:
+        ax.scatter([point[1]], [point[0]], color='green', marker='x')
+    ax.autoscale()
+    ax.set_aspect('equal')
+    ax.set_title("Scene footprints with centroids")
+    fig.savefig(png_path, dpi=100)
+    plt.close(fig)
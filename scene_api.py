@@ -0,0 +1,235 @@
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from metrics import stage
+
+# Which scene search backend to use: 'm2m' for the USGS M2M API through
+# landsatxplore, or the path of a local JSON dump (like the one
+# landsat_api_integration.py writes) to work offline and in tests
+LANDSAT_API = os.environ.get('LANDSAT_API', 'm2m')
+
+# EarthExplorer credentials, taken from the environment rather than the source
+LANDSAT_USERNAME = os.environ.get('LANDSAT_USERNAME')
+LANDSAT_PASSWORD = os.environ.get('LANDSAT_PASSWORD')
+
+# Number of logged-in clients kept around, and how long a client is reused
+# before it logs in again (M2M API tokens are valid for two hours)
+API_POOL_SIZE = int(os.environ.get('API_POOL_SIZE', '4'))
+API_SESSION_LIFETIME = float(os.environ.get('API_SESSION_LIFETIME', 110 * 60))
+
+# Metadata fields landsatxplore returns as datetime objects
+DATETIME_FIELDS = ('acquisition_date', 'date_product_generated', 'start_time', 'stop_time')
+
+# Spaces out calls so that at most `rate` of them start per second, shared by all threads
+class RateLimiter:
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    # Function to wait for this call's turn. With max_delay, a call that would
+    # wait longer doesn't take a turn and returns False straight away.
+    def wait(self, max_delay=None):
+        if not self.interval:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            if max_delay is not None and start - now > max_delay:
+                return False
+            self.next_time = start + self.interval
+        time.sleep(start - now)
+        return True
+
+# Stand-in for landsatxplore.api.API that answers searches from a local dump
+class LocalAPI:
+    def __init__(self, username=None, password=None, dump_file='landsat_scenes_data.txt'):
+        from shapely.wkt import loads
+
+        with open(dump_file) as infile:
+            self.scenes = json.load(infile)
+        for scene in self.scenes:
+            for field in DATETIME_FIELDS:
+                if isinstance(scene.get(field), str):
+                    scene[field] = datetime.fromisoformat(scene[field])
+            scene['spatial_coverage'] = loads(scene['spatial_coverage'])
+        self.search_count = 0
+
+    # Same signature and filters as landsatxplore's API.search
+    def search(self, dataset, longitude=None, latitude=None, bbox=None, max_cloud_cover=None,
+               start_date=None, end_date=None, months=None, max_results=100):
+        from shapely.geometry import Point, box
+
+        self.search_count += 1
+        area = None
+        if longitude is not None and latitude is not None:
+            area = Point(longitude, latitude)
+        elif bbox:
+            area = box(*bbox)
+
+        results = []
+        for scene in self.scenes:
+            acquired = scene['acquisition_date']
+            if start_date and acquired < datetime.fromisoformat(start_date):
+                continue
+            if end_date and acquired > datetime.fromisoformat(end_date):
+                continue
+            if max_cloud_cover and scene['cloud_cover'] > max_cloud_cover:
+                continue
+            if months and acquired.month not in months:
+                continue
+            if area is not None and not scene['spatial_coverage'].intersects(area):
+                continue
+            results.append(dict(scene))
+        return results[:max_results]
+
+    def logout(self):
+        pass
+
+# Function to create a scene search client for the configured backend
+def create_api(username=LANDSAT_USERNAME, password=LANDSAT_PASSWORD):
+    if LANDSAT_API == 'm2m':
+        from landsatxplore.api import API
+        if not username or not password:
+            raise RuntimeError("Set LANDSAT_USERNAME and LANDSAT_PASSWORD to search the USGS M2M API.")
+        return API(username, password)
+    return LocalAPI(username, password, dump_file=LANDSAT_API)
+
+# Function to tell whether an error means the client's token is no longer valid
+def is_auth_error(error):
+    try:
+        from landsatxplore.errors import USGSAuthenticationError, USGSUnauthorizedError
+    except ImportError:
+        return False
+    return isinstance(error, (USGSAuthenticationError, USGSUnauthorizedError))
+
+# Bounded pool of logged-in API clients shared by the Flask worker threads.
+# Clients are logged in again before their token expires, and a client that
+# hits an authentication error is replaced and the call retried once.
+class APIPool:
+    def __init__(self, size=API_POOL_SIZE, lifetime=API_SESSION_LIFETIME, create=create_api):
+        self.size = size
+        self.lifetime = lifetime
+        self.create = create
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+        self.stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.auth_errors = 0
+        self.calls = 0
+        self.call_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.login_seconds = 0.0
+
+    def _count(self, **increments):
+        with self.stats_lock:
+            for name, value in increments.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def _login(self):
+        start = time.perf_counter()
+        client = self.create()
+        self._count(login_seconds=time.perf_counter() - start)
+        return client, time.monotonic()
+
+    @staticmethod
+    def _logout(client):
+        try:
+            client.logout()
+        except Exception:
+            pass
+
+    # Take a client out of the pool, logging in if none is idle or the idle
+    # one is about to expire
+    def acquire(self):
+        start = time.perf_counter()
+        self.slots.acquire()
+        self._count(wait_seconds=time.perf_counter() - start)
+        try:
+            try:
+                client, logged_in_at = self.idle.get_nowait()
+            except queue.Empty:
+                self._count(misses=1)
+                return self._login()
+
+            if time.monotonic() - logged_in_at > self.lifetime:
+                self._count(refreshes=1)
+                self._logout(client)
+                return self._login()
+        except BaseException:
+            # Login failed, give the slot back
+            self.slots.release()
+            raise
+        self._count(hits=1)
+        return client, logged_in_at
+
+    def release(self, entry, broken=False):
+        if broken:
+            self._logout(entry[0])
+        else:
+            self.idle.put(entry)
+        self.slots.release()
+
+    # Run fn(client) with a pooled client and return its result
+    def call(self, fn):
+        start = time.perf_counter()
+        try:
+            for attempt in range(2):
+                entry = self.acquire()
+                try:
+                    with stage('api_call'):
+                        result = fn(entry[0])
+                except Exception as e:
+                    # An expired or revoked token: drop the client and retry once with a fresh login
+                    if is_auth_error(e):
+                        self._count(auth_errors=1)
+                        self.release(entry, broken=True)
+                        if attempt == 0:
+                            continue
+                    else:
+                        self.release(entry)
+                    raise
+                self.release(entry)
+                return result
+        finally:
+            self._count(calls=1, call_seconds=time.perf_counter() - start)
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                'size': self.size,
+                'idle': self.idle.qsize(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'refreshes': self.refreshes,
+                'auth_errors': self.auth_errors,
+                'calls': self.calls,
+                'mean_call_seconds': self.call_seconds / self.calls if self.calls else 0.0,
+                'mean_wait_seconds': self.wait_seconds / self.calls if self.calls else 0.0,
+                'login_seconds': self.login_seconds,
+            }
+
+    # Log out every idle client, e.g. on shutdown
+    def close(self):
+        while True:
+            try:
+                client, _ = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            self._logout(client)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Function to get the process-wide API client pool
+def get_api_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = APIPool()
+    return _pool
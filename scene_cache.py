@@ -0,0 +1,158 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from scene_api import get_api_pool
+from wrs_grid import get_wrs_grid
+
+# Where scene search results are cached, for how long (seconds) and how many
+# searches are kept before the least recently used ones are evicted
+SCENE_CACHE_PATH = os.environ.get('SCENE_CACHE_PATH', 'scene_cache.sqlite3')
+SCENE_CACHE_TTL = float(os.environ.get('SCENE_CACHE_TTL', 6 * 3600))
+SCENE_CACHE_MAX_ENTRIES = int(os.environ.get('SCENE_CACHE_MAX_ENTRIES', 10000))
+# Most scenes fetched for one tile search
+SCENE_CACHE_MAX_RESULTS = int(os.environ.get('SCENE_CACHE_MAX_RESULTS', 10000))
+
+# Function to build the cache key of a scene search
+def scene_cache_key(path, row, dataset, start_date, end_date, max_cloud_cover):
+    return json.dumps([path, row, dataset, str(start_date), str(end_date), max_cloud_cover])
+
+# Scenes hold datetimes and shapely polygons, store them tagged so they come
+# back as the same types landsatxplore returns
+def scene_json_default(obj):
+    if isinstance(obj, datetime):
+        return {'__datetime__': obj.isoformat()}
+    elif hasattr(obj, 'wkt'):
+        return {'__wkt__': obj.wkt}
+    raise TypeError(f"Type {obj.__class__.__name__} not serializable")
+
+def scene_json_hook(obj):
+    if '__datetime__' in obj:
+        return datetime.fromisoformat(obj['__datetime__'])
+    elif '__wkt__' in obj:
+        from shapely.wkt import loads
+        return loads(obj['__wkt__'])
+    return obj
+
+# SQLite-backed cache of scene search results with TTL, LRU eviction and
+# coalescing of concurrent identical misses
+class SceneCache:
+    def __init__(self, path=SCENE_CACHE_PATH, ttl=SCENE_CACHE_TTL, max_entries=SCENE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ':memory:':
+            self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS scenes ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)'
+        )
+        self.connection.execute('CREATE INDEX IF NOT EXISTS scenes_accessed ON scenes (accessed)')
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    # Return the cached scenes for key, or None if missing or expired
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute('SELECT value, created FROM scenes WHERE key = ?', (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                return None
+            self.connection.execute('UPDATE scenes SET accessed = ? WHERE key = ?', (now, key))
+        return json.loads(row[0], object_hook=scene_json_hook)
+
+    def put(self, key, scenes):
+        value = json.dumps(scenes, default=scene_json_default)
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO scenes (key, value, created, accessed) VALUES (?, ?, ?, ?)',
+                (key, value, now, now),
+            )
+            # Drop expired entries, then the least recently used ones above the bound
+            self.connection.execute('DELETE FROM scenes WHERE created < ?', (now - self.ttl,))
+            count = self.connection.execute('SELECT COUNT(*) FROM scenes').fetchone()[0]
+            if count > self.max_entries:
+                self.connection.execute(
+                    'DELETE FROM scenes WHERE key IN (SELECT key FROM scenes ORDER BY accessed LIMIT ?)',
+                    (count - self.max_entries,),
+                )
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'coalesced': self.coalesced}
+
+    # Return the cached scenes for key, calling fetch() on a miss. Concurrent
+    # misses for the same key wait for the first caller's fetch instead of
+    # each going upstream.
+    def get_or_fetch(self, key, fetch):
+        scenes = self.get(key)
+        if scenes is not None:
+            self.hits += 1
+            return scenes
+
+        with self.lock:
+            future = self.pending.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.pending[key] = future
+        if not owner:
+            self.coalesced += 1
+            return future.result()
+
+        try:
+            # Another thread may have filled the entry since our first look
+            scenes = self.get(key)
+            if scenes is None:
+                self.misses += 1
+                scenes = fetch()
+                self.put(key, scenes)
+            future.set_result(scenes)
+            return scenes
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.pending[key]
+
+_cache = None
+_cache_lock = threading.Lock()
+
+# Function to get the process-wide scene cache
+def get_scene_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SceneCache()
+    return _cache
+
+# Function to search scenes around a point. The cache holds the scenes of the
+# whole tile, so every point of a tile searched recently with the same
+# dataset, date range and cloud cover is answered from it, filtered against
+# the scene footprints. Misses go upstream through the shared pool of
+# logged-in API clients.
+def cached_search(lat, lon, path, row, start_date, end_date,
+                  dataset='landsat_ot_c2_l2', max_cloud_cover=10):
+    from shapely import Point
+
+    def fetch():
+        tile = get_wrs_grid().get_tile(path, row)
+        return get_api_pool().call(lambda api: api.search(
+            dataset=dataset,
+            bbox=tile.bounds,
+            start_date=start_date,
+            end_date=end_date,
+            max_cloud_cover=max_cloud_cover,
+            max_results=SCENE_CACHE_MAX_RESULTS
+        ))
+
+    key = scene_cache_key(path, row, dataset, start_date, end_date, max_cloud_cover)
+    point = Point(float(lon), float(lat))
+    return [scene for scene in get_scene_cache().get_or_fetch(key, fetch) if scene['spatial_coverage'].intersects(point)]
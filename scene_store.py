@@ -0,0 +1,270 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from metrics import stage, timed
+from scene_api import get_api_pool
+from scene_cache import scene_json_default, scene_json_hook
+from wrs_grid import get_wrs_grid
+
+# Local store of scene metadata, where syncing starts for a tile seen for the
+# first time, and how old a tile's last sync may get before a request syncs it again
+SCENE_STORE_PATH = os.environ.get('SCENE_STORE_PATH', 'scene_store.sqlite3')
+SCENE_SYNC_START = os.environ.get('SCENE_SYNC_START', '2024-01-01')
+SCENE_SYNC_INTERVAL = float(os.environ.get('SCENE_SYNC_INTERVAL', 24 * 3600))
+SCENE_SYNC_MAX_RESULTS = int(os.environ.get('SCENE_SYNC_MAX_RESULTS', 10000))
+# Days before the newest stored acquisition an incremental sync searches
+# again. The tile bbox also returns scenes of neighbouring paths acquired on
+# other days, and scenes can be published days after their acquisition.
+SCENE_SYNC_LOOKBACK = float(os.environ.get('SCENE_SYNC_LOOKBACK', 30))
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS scenes (
+    entity_id TEXT PRIMARY KEY,
+    dataset TEXT NOT NULL,
+    wrs_path INTEGER,
+    wrs_row INTEGER,
+    acquisition_date TEXT NOT NULL,
+    cloud_cover REAL,
+    min_lon REAL, min_lat REAL, max_lon REAL, max_lat REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scenes_date ON scenes (dataset, acquisition_date);
+CREATE INDEX IF NOT EXISTS scenes_cloud ON scenes (dataset, cloud_cover);
+CREATE INDEX IF NOT EXISTS scenes_bounds ON scenes (min_lon, max_lon, min_lat, max_lat);
+CREATE TABLE IF NOT EXISTS sync_state (
+    path INTEGER NOT NULL,
+    row INTEGER NOT NULL,
+    dataset TEXT NOT NULL,
+    newest_acquisition TEXT,
+    last_sync REAL NOT NULL,
+    PRIMARY KEY (path, row, dataset)
+);
+'''
+
+# Function to turn a date, datetime or 'YYYY-MM-DD...' string into an ISO string
+def _iso(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+# SQLite store of scene metadata, synced incrementally per WRS-2 tile
+class SceneStore:
+    def __init__(self, path=SCENE_STORE_PATH):
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ':memory:':
+            self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        # Tile syncs in progress, keyed by (path, row, dataset)
+        self.pending = {}
+        self.syncs = 0
+        self.coalesced = 0
+
+    # Insert new scenes and update the ones already stored, keyed by entity_id
+    def upsert(self, scenes, dataset):
+        records = []
+        for scene in scenes:
+            bounds = scene['spatial_coverage'].bounds
+            records.append((
+                scene['entity_id'], dataset, scene.get('wrs_path'), scene.get('wrs_row'),
+                _iso(scene['acquisition_date']), scene.get('cloud_cover'), *bounds,
+                json.dumps(scene, default=scene_json_default),
+            ))
+        with self.lock:
+            self.connection.execute('BEGIN')
+            self.connection.executemany(
+                'INSERT INTO scenes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (entity_id) DO UPDATE SET '
+                'dataset = excluded.dataset, wrs_path = excluded.wrs_path, wrs_row = excluded.wrs_row, '
+                'acquisition_date = excluded.acquisition_date, cloud_cover = excluded.cloud_cover, '
+                'min_lon = excluded.min_lon, min_lat = excluded.min_lat, '
+                'max_lon = excluded.max_lon, max_lat = excluded.max_lat, data = excluded.data',
+                records,
+            )
+            self.connection.execute('COMMIT')
+        return len(records)
+
+    # Return (newest_acquisition, last_sync) for a tile, or (None, None) if never synced
+    def sync_state(self, path, row, dataset):
+        with self.lock:
+            state = self.connection.execute(
+                'SELECT newest_acquisition, last_sync FROM sync_state WHERE path = ? AND row = ? AND dataset = ?',
+                (path, row, dataset),
+            ).fetchone()
+        return state if state is not None else (None, None)
+
+    def _record_sync(self, path, row, dataset, newest_acquisition):
+        with self.lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?, ?)',
+                (path, row, dataset, newest_acquisition, time.time()),
+            )
+
+    # Fetch only the acquisitions since the newest one stored for this tile,
+    # less SCENE_SYNC_LOOKBACK days so scenes published late are picked up
+    # too. Scenes fetched again are folded by entity_id.
+    @timed('scene_sync')
+    def sync_tile(self, path, row, dataset='landsat_ot_c2_l2', end_date=None):
+        tile = get_wrs_grid().get_tile(path, row)
+        if tile is None:
+            return 0
+        newest, last_sync = self.sync_state(path, row, dataset)
+        start_date = SCENE_SYNC_START
+        if newest or last_sync:
+            # Synced before, last_sync when nothing was acquired yet
+            since = datetime.fromisoformat(newest[:10]) if newest else datetime.fromtimestamp(last_sync)
+            start_date = max((since - timedelta(days=SCENE_SYNC_LOOKBACK)).strftime('%Y-%m-%d'), SCENE_SYNC_START)
+        end_date = end_date or datetime.now().strftime('%Y-%m-%d')
+
+        # Search the whole tile, so any point in it can be answered locally
+        scenes = get_api_pool().call(lambda api: api.search(
+            dataset=dataset,
+            bbox=tile.bounds,
+            start_date=start_date,
+            end_date=end_date,
+            max_results=SCENE_SYNC_MAX_RESULTS
+        ))
+        count = self.upsert(scenes, dataset)
+
+        acquisitions = [_iso(scene['acquisition_date']) for scene in scenes]
+        if newest:
+            acquisitions.append(newest)
+        self._record_sync(path, row, dataset, max(acquisitions) if acquisitions else None)
+        return count
+
+    # Function to tell whether a tile needs syncing: never synced, or last
+    # synced more than SCENE_SYNC_INTERVAL ago
+    def is_stale(self, path, row, dataset='landsat_ot_c2_l2'):
+        _, last_sync = self.sync_state(path, row, dataset)
+        return last_sync is None or time.time() - last_sync > SCENE_SYNC_INTERVAL
+
+    # Sync a tile unless it was synced less than SCENE_SYNC_INTERVAL ago.
+    # Concurrent requests for the same stale tile wait for the first one's
+    # sync instead of each searching the whole tile upstream.
+    def ensure_synced(self, path, row, dataset='landsat_ot_c2_l2'):
+        if not self.is_stale(path, row, dataset):
+            return
+
+        key = (path, row, dataset)
+        with self.lock:
+            future = self.pending.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.pending[key] = future
+        if not owner:
+            self.coalesced += 1
+            future.result()
+            return
+
+        try:
+            # Another thread may have synced the tile since our first look
+            if self.is_stale(path, row, dataset):
+                self.syncs += 1
+                self.sync_tile(path, row, dataset)
+            future.set_result(None)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.pending[key]
+
+    def stats(self):
+        return {'syncs': self.syncs, 'coalesced': self.coalesced}
+
+    # Return the stored scenes whose footprint contains the point, acquired
+    # between start_date and end_date (both inclusive) with cloud cover at
+    # most max_cloud_cover, oldest first
+    def query(self, lat, lon, start_date, end_date, max_cloud_cover=None, dataset='landsat_ot_c2_l2'):
+        return list(self.iter_query(lat, lon, start_date, end_date, max_cloud_cover, dataset))
+
+    # Same as query, but decodes and yields the scenes one at a time
+    def iter_query(self, lat, lon, start_date, end_date, max_cloud_cover=None, dataset='landsat_ot_c2_l2'):
+        from shapely import Point
+
+        end_bound = (datetime.fromisoformat(str(end_date)[:10]) + timedelta(days=1)).strftime('%Y-%m-%d')
+        sql = ('SELECT data FROM scenes WHERE dataset = ? AND acquisition_date >= ? AND acquisition_date < ? '
+               'AND min_lon <= ? AND max_lon >= ? AND min_lat <= ? AND max_lat >= ?')
+        params = [dataset, _iso(start_date), end_bound, lon, lon, lat, lat]
+        if max_cloud_cover is not None:
+            sql += ' AND cloud_cover <= ?'
+            params.append(max_cloud_cover)
+        sql += ' ORDER BY acquisition_date'
+
+        with stage('scene_query'), self.lock:
+            rows = self.connection.execute(sql, params).fetchall()
+
+        # The bounding box test above is only a pre-filter, check the footprint itself
+        point = Point(lon, lat)
+        for (data,) in rows:
+            scene = json.loads(data, object_hook=scene_json_hook)
+            if scene['spatial_coverage'].intersects(point):
+                yield scene
+
+    # Every tile that has been synced at least once
+    def synced_tiles(self, dataset='landsat_ot_c2_l2'):
+        with self.lock:
+            return self.connection.execute(
+                'SELECT path, row FROM sync_state WHERE dataset = ?', (dataset,)
+            ).fetchall()
+
+_store = None
+_store_lock = threading.Lock()
+
+# Function to get the process-wide scene store
+def get_scene_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SceneStore()
+    return _store
+
+# Function to compare how long the old text dump and the store take to load
+def compare_with_dump(dump_file, store, lat, lon, start_date, end_date):
+    from shapely.wkt import loads
+
+    start = time.perf_counter()
+    with open(dump_file) as infile:
+        scenes = json.load(infile)
+    for scene in scenes:
+        loads(scene['spatial_coverage'])
+    dump_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    stored = store.query(lat, lon, start_date, end_date)
+    store_seconds = time.perf_counter() - start
+
+    print(f"Text dump: {len(scenes)} scenes loaded in {dump_seconds * 1000:.2f} ms.")
+    print(f"Scene store: {len(stored)} scenes queried in {store_seconds * 1000:.2f} ms.")
+
+# Incremental sync job, meant to run from cron or a scheduler
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally sync Landsat scene metadata into the local store.")
+    parser.add_argument('--site', nargs=2, type=float, action='append', default=[], metavar=('LAT', 'LON'),
+                        help="also sync the tile covering this site (repeatable)")
+    parser.add_argument('--dataset', default='landsat_ot_c2_l2')
+    parser.add_argument('--compare-dump', metavar='DUMP_FILE',
+                        help="time loading this text dump against querying the store for the first site")
+    args = parser.parse_args()
+
+    store = get_scene_store()
+    tiles = set(store.synced_tiles(args.dataset))
+    for lat, lon in args.site:
+        path, row = get_wrs_grid().lookup(lat, lon)
+        if path is not None:
+            tiles.add((path, row))
+
+    for path, row in sorted(tiles):
+        start = time.perf_counter()
+        count = store.sync_tile(path, row, args.dataset)
+        print(f"Path {path}, Row {row}: {count} scenes fetched in {time.perf_counter() - start:.2f} s.")
+
+    if args.compare_dump and args.site:
+        lat, lon = args.site[0]
+        compare_with_dump(args.compare_dump, store, lat, lon, SCENE_SYNC_START, datetime.now().strftime('%Y-%m-%d'))
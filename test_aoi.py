@@ -0,0 +1,105 @@
+import json
+import numpy as np
+import pytest
+
+# Checks of the area of interest parsing, the per-tile coverage fractions and
+# the merged passes (aoi.py), on the synthetic grid
+
+SQUARE = {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]]}
+
+@pytest.mark.parametrize('value', [
+    SQUARE,
+    json.dumps(SQUARE),
+    {'type': 'Feature', 'properties': {}, 'geometry': SQUARE},
+    {'type': 'FeatureCollection', 'features': [{'type': 'Feature', 'properties': {}, 'geometry': SQUARE}]},
+    'POLYGON ((0 0, 1 0, 1 1, 0 1, 0 0))',
+])
+def test_parse_aoi_formats(value):
+    from aoi import parse_aoi
+
+    assert parse_aoi(value).area == pytest.approx(1.0)
+
+def test_parse_aoi_repairs_self_intersections():
+    from aoi import parse_aoi
+
+    # A bow tie, two triangles of a quarter each
+    assert parse_aoi('POLYGON ((0 0, 1 1, 1 0, 0 1, 0 0))').area == pytest.approx(0.5)
+
+@pytest.mark.parametrize('value', [
+    None, 42, 'nonsense', 'POINT (1 2)', '{"type": "Polygon"',
+    {'type': 'Feature', 'geometry': None},
+    {'type': 'Polygon', 'coordinates': 'x'},
+    {'type': 'FeatureCollection', 'features': []},
+])
+def test_parse_aoi_rejects_unusable_areas(value):
+    from aoi import parse_aoi
+
+    with pytest.raises(ValueError):
+        parse_aoi(value)
+
+def test_aoi_inside_one_tile(bench_sites):
+    import shapely
+    from aoi import aoi_tiles
+    from wrs_grid import get_wrs_grid
+
+    grid = get_wrs_grid()
+    lat, lon = bench_sites[0]
+    path, row = grid.lookup(lat, lon)
+    tile = grid.get_tile(path, row)
+    aoi = shapely.box(lon - 0.05, lat - 0.05, lon + 0.05, lat + 0.05)
+
+    tiles = aoi_tiles(aoi)
+    index = np.flatnonzero((tiles['path'] == path) & (tiles['row'] == row))[0]
+    assert tiles['aoi_fraction'][index] == pytest.approx(1.0)
+    assert tiles['tile_fraction'][index] == pytest.approx(aoi.area / tile.area)
+    assert np.all(tiles['aoi_fraction'] <= 1.0) and np.all(tiles['tile_fraction'] <= 1.0)
+    assert list(zip(tiles['path'].tolist(), tiles['row'].tolist())) == sorted(zip(tiles['path'].tolist(), tiles['row'].tolist()))
+
+def test_aoi_fractions_of_a_whole_tile(bench_sites):
+    from aoi import aoi_tiles
+    from wrs_grid import get_wrs_grid
+
+    grid = get_wrs_grid()
+    path, row = grid.lookup(*bench_sites[0])
+    aoi = grid.get_tile(path, row)
+
+    tiles = aoi_tiles(aoi)
+    index = np.flatnonzero((tiles['path'] == path) & (tiles['row'] == row))[0]
+    assert tiles['aoi_fraction'][index] == pytest.approx(1.0)
+    assert tiles['tile_fraction'][index] == pytest.approx(1.0)
+    # The neighbours overlap the tile, each of them holds part of it
+    assert len(tiles['path']) > 1
+    for fraction in np.delete(tiles['aoi_fraction'], index):
+        assert 0 < fraction < 1
+    assert sum(part.area for part in tiles['geometry']) >= aoi.area
+
+def test_aoi_passes_merge_the_rows_of_a_path(bench_sites):
+    import shapely
+    from aoi import aoi_passes, aoi_tiles
+
+    lat, lon = bench_sites[0]
+    aoi = shapely.box(lon - 1, lat - 3, lon + 1, lat + 3)
+    tiles = aoi_tiles(aoi)
+    start = np.datetime64('2024-01-01')
+    passes = aoi_passes(tiles, aoi, start, start + 32, ('landsat8',))
+
+    times = [entry['time'] for entry in passes]
+    assert times == sorted(times)
+    seen = set()
+    for entry in passes:
+        key = (entry['path'], entry['time'].astype('datetime64[D]'))
+        assert key not in seen
+        seen.add(key)
+        assert set(entry['rows']) <= set(tiles['row'][tiles['path'] == entry['path']].tolist())
+        assert 0 < entry['aoi_fraction'] <= 1
+    # Every path of the area comes by twice in 32 days
+    assert {entry['path'] for entry in passes} == set(tiles['path'].tolist())
+    assert len(passes) == 2 * len(set(tiles['path'].tolist()))
+
+def test_get_aoi_rejects_bad_input():
+    from app import app
+
+    client = app.test_client()
+    assert client.post('/get_aoi', json={'aoi': 'POINT (1 2)'}).status_code == 400
+    assert client.post('/get_aoi', json={'aoi': SQUARE, 'mode': 'X'}).status_code == 400
+    assert client.post('/get_aoi', json={'aoi': SQUARE, 'start_date': '2024-02-01', 'end_date': '2024-01-01'}).status_code == 400
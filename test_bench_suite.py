@@ -0,0 +1,215 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pytest
+from bench_suite import BENCH_SEED
+
+# Correctness checks of the lookup caches, the overpass table, the scene
+# cache and the alert scheduler, plus the bench_suite.py measurements as
+# pytest-benchmark tests (skipped when pytest-benchmark isn't installed).
+# Runs offline on the synthetic grid and scene dump of bench_suite.py, set up
+# by the bench_sites fixture in conftest.py.
+
+# Function to draw random points over the grid, plus clusters of nearby
+# points around the benchmark sites so the quantized cache gets hits
+def sample_points(sites, count=5000):
+    rng = np.random.default_rng(BENCH_SEED)
+    lats = rng.uniform(-80, 80, count).tolist()
+    lons = rng.uniform(-180, 180, count).tolist()
+    for lat, lon in sites:
+        for dlat, dlon in rng.uniform(-0.02, 0.02, (20, 2)).tolist():
+            lats.append(lat + dlat)
+            lons.append(lon + dlon)
+    return list(zip(lats, lons))
+
+def test_tile_cache_matches_grid(bench_sites):
+    from wrs_grid import TileLookupCache, get_wrs_grid
+
+    grid = get_wrs_grid()
+    cache = TileLookupCache(grid)
+    for lat, lon in sample_points(bench_sites) * 2:
+        assert cache.lookup_all(lat, lon) == grid.lookup_all(lat, lon)
+        assert cache.lookup(lat, lon) == grid.lookup(lat, lon)
+    assert cache.hits > 0
+
+def test_lookup_many_matches_lookup(bench_sites):
+    from wrs_grid import NO_TILE, get_wrs_grid
+
+    grid = get_wrs_grid()
+    points = sample_points(bench_sites)
+    paths, rows = grid.lookup_many([lat for lat, _ in points], [lon for _, lon in points])
+    for (lat, lon), path, row in zip(points, paths.tolist(), rows.tolist()):
+        expected = grid.lookup(lat, lon)
+        assert (path, row) == (expected if expected[0] is not None else (NO_TILE, NO_TILE))
+
+# The table stores the timezone at the tile centroid, so compare there
+def test_overpass_table_matches_fallback(monkeypatch, bench_sites):
+    import LandsatCalc
+    from LandsatCalc import calculate_time, get_cycle_day, get_next_cycle_day, utc_now
+    from wrs_grid import get_wrs_grid
+
+    grid = get_wrs_grid()
+    now = utc_now()
+    cases = []
+    for lat, lon in bench_sites:
+        path, row = grid.lookup(lat, lon)
+        centroid = grid.get_tile(path, row).centroid
+        cases.append((path, row, get_next_cycle_day(now, get_cycle_day(path)), centroid.y, centroid.x))
+
+    fast = [calculate_time(*case) for case in cases]
+    monkeypatch.setattr(LandsatCalc, 'get_overpass_table', lambda: None)
+    slow = [calculate_time(*case) for case in cases]
+    for fast_time, slow_time in zip(fast, slow):
+        assert abs(fast_time - slow_time) < timedelta(milliseconds=1)
+        assert fast_time.tzname() == slow_time.tzname()
+
+def test_schedule_starts_with_next_overpass(bench_sites):
+    from LandsatCalc import (calculate_time, get_cycle_day, get_landsat_path_row, get_next_cycle_day,
+                             get_overpass_schedule, utc_now)
+
+    now = utc_now()
+    tiles = [get_landsat_path_row(lat, lon) + (lat, lon) for lat, lon in bench_sites]
+    start = np.datetime64(now.date() + timedelta(days=1), 'D')
+    schedule = get_overpass_schedule([tile[0] for tile in tiles], [tile[1] for tile in tiles],
+                                     start, start + 32, ('landsat8',))
+    for site, (path, row, lat, lon) in enumerate(tiles):
+        first = schedule['time'][schedule['site'] == site][0]
+        expected = calculate_time(path, row, get_next_cycle_day(now, get_cycle_day(path)), lat, lon)
+        expected = np.datetime64(expected.astimezone(timezone.utc).replace(tzinfo=None), 'ms')
+        assert abs(first - expected) < np.timedelta64(1, 'ms')
+
+def test_scene_cache_coalesces_misses():
+    from scene_cache import SceneCache
+
+    cache = SceneCache(path=':memory:')
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return [{'entity_id': 'LC8', 'acquisition_date': datetime(2024, 1, 1)}]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_fetch('tile', fetch))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while cache.coalesced < 7 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert cache.coalesced == 7
+    assert all(result == results[0] for result in results)
+    assert cache.get_or_fetch('tile', fetch) == results[0] and len(calls) == 1
+
+def test_alert_scheduler_delivers_to_sink(bench_sites):
+    from alert_scheduler import AlertScheduler, MemorySink
+
+    sink = MemorySink()
+    scheduler = AlertScheduler(sinks=(sink,), store_path=':memory:', lead_time=timedelta(0))
+    overpass_time = datetime.now(timezone.utc) + timedelta(seconds=0.2)
+    lat, lon = bench_sites[0]
+    scheduler.subscribe('site', lat, lon, overpass_time)
+    scheduler.start()
+    try:
+        deadline = time.monotonic() + 5
+        while not sink.alerts and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        scheduler.stop()
+
+    assert sink.alerts == [('site', lat, lon, overpass_time)]
+    # The subscription moved on to the following overpass
+    assert scheduler.subscriptions['site'][2] > overpass_time
+
+def test_alert_scheduler_skips_missed_overpasses(bench_sites):
+    from alert_scheduler import AlertScheduler, MemorySink, next_overpass
+    from LandsatCalc import utc_now
+
+    sink = MemorySink()
+    scheduler = AlertScheduler(sinks=(sink,), store_path=':memory:')
+    lat, lon = bench_sites[0]
+    scheduler.subscribe('site', lat, lon, next_overpass(lat, lon, utc_now() - timedelta(days=100)))
+    assert scheduler.fire_due() == 0
+    assert sink.alerts == []
+    assert scheduler.subscriptions['site'][2] > datetime.now(timezone.utc)
+
+def test_alert_scheduler_retries_failed_overpass(monkeypatch, bench_sites):
+    import alert_scheduler
+    from alert_scheduler import ALERT_GRACE_SECONDS, ALERT_RETRY_SECONDS, AlertScheduler, MemorySink
+
+    sink = MemorySink()
+    scheduler = AlertScheduler(sinks=(sink,), store_path=':memory:', lead_time=timedelta(0))
+    overpass_time = datetime.now(timezone.utc)
+    lat, lon = bench_sites[0]
+    scheduler.subscribe('site', lat, lon, overpass_time)
+
+    next_overpass = alert_scheduler.next_overpass
+    monkeypatch.setattr(alert_scheduler, 'next_overpass', lambda *args: 1 / 0)
+    now = overpass_time.timestamp()
+    assert scheduler.fire_due(now) == 1
+    # Still subscribed, retried once the overpass counts as missed
+    assert scheduler.subscriptions['site'][2] == overpass_time
+    assert scheduler.heap[0][0] == now + ALERT_GRACE_SECONDS + ALERT_RETRY_SECONDS
+
+    monkeypatch.setattr(alert_scheduler, 'next_overpass', next_overpass)
+    assert scheduler.fire_due(scheduler.heap[0][0]) == 0
+    assert scheduler.subscriptions['site'][2] > overpass_time
+    scheduler.stop()
+    assert len(sink.alerts) == 1
+
+# bench_suite.py measurements, one call per benchmark site per round
+@pytest.fixture
+def benchmark_calls(request):
+    pytest.importorskip('pytest_benchmark')
+    return request.getfixturevalue('benchmark')
+
+def test_bench_get_landsat_path_row(benchmark_calls, bench_sites):
+    from LandsatCalc import get_landsat_path_row
+
+    benchmark_calls(lambda: [get_landsat_path_row(lat, lon) for lat, lon in bench_sites])
+
+def test_bench_get_covering_path_rows(benchmark_calls, bench_sites):
+    from LandsatCalc import get_covering_path_rows
+
+    benchmark_calls(lambda: [get_covering_path_rows(lat, lon) for lat, lon in bench_sites])
+
+def test_bench_calculate_time(benchmark_calls, bench_sites):
+    from LandsatCalc import calculate_time, get_cycle_day, get_landsat_path_row, get_next_cycle_day, utc_now
+
+    now = utc_now()
+    calls = []
+    for lat, lon in bench_sites:
+        path, row = get_landsat_path_row(lat, lon)
+        calls.append((path, row, get_next_cycle_day(now, get_cycle_day(path)), lat, lon))
+    benchmark_calls(lambda: [calculate_time(*call) for call in calls])
+
+def test_bench_get_landsat_path_rows(benchmark_calls):
+    from LandsatCalc import get_landsat_path_rows
+
+    rng = np.random.default_rng(BENCH_SEED)
+    lats = rng.uniform(-60, 60, 100000)
+    lons = rng.uniform(-180, 180, 100000)
+    benchmark_calls(get_landsat_path_rows, lats, lons)
+
+@pytest.mark.parametrize('url', ['/get_time', '/get_polygons'])
+def test_bench_endpoint(benchmark_calls, bench_sites, url):
+    from app import app
+
+    client = app.test_client()
+    payloads = [{'latitude': lat, 'longitude': lon, 'start_date': '2024-01-01', 'end_date': '2024-10-01'}
+                for lat, lon in bench_sites]
+
+    def run():
+        for payload in payloads:
+            response = client.post(url, json=payload)
+            response.get_data()
+            assert response.status_code == 200
+
+    run()  # The first request per tile syncs it into the scene store
+    benchmark_calls(run)
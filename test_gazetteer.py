@@ -0,0 +1,90 @@
+import pytest
+
+# Checks of the local place search behind /locate (gazetteer.py), on a small
+# GeoNames-style file
+
+# name, ascii name, alternate names, latitude, longitude, feature class, country, population
+PLACES = [
+    ('Paris', 'Paris', 'Lutece,Parigi', 48.85, 2.35, 'P', 'FR', 2138551),
+    ('Paris', 'Paris', '', 33.66, -95.56, 'P', 'US', 24171),
+    ('Parish', 'Parish', '', 43.41, -76.13, 'P', 'US', 3000000),
+    ('Parisot', 'Parisot', '', 44.26, 1.86, 'P', 'FR', 500),
+    ('Milano', 'Milano', 'Milan,Mailand', 45.46, 9.19, 'P', 'IT', 1236837),
+    ('São Paulo', 'Sao Paulo', '', -23.55, -46.64, 'P', 'BR', 10021295),
+    ('Austin, TX', 'Austin, TX', '', 30.27, -97.74, 'P', 'US', 931830),
+    ('Lake Paris', 'Lake Paris', '', 50.0, 3.0, 'H', 'FR', 0),
+    ('Parisville', 'Parisville', '', 43.8, -82.9, 'P', 'US', 0),
+]
+
+# Function to write PLACES as a GeoNames dump
+def write_geonames(path):
+    with open(path, 'w', encoding='utf-8') as f:
+        for geonameid, (name, ascii_name, alternates, lat, lon, feature_class, country, population) in enumerate(PLACES):
+            fields = [str(geonameid), name, ascii_name, alternates, str(lat), str(lon), feature_class, 'PPL',
+                      country, '', '', '', '', '', str(population), '', '', 'Europe/Paris', '2024-01-01']
+            f.write('\t'.join(fields) + '\n')
+    return str(path)
+
+@pytest.fixture
+def gazetteer(tmp_path):
+    from gazetteer import load_geonames
+
+    return load_geonames(write_geonames(tmp_path / 'cities.txt'), feature_classes=('P', 'A'))
+
+# Function to list (name, country) of a search's results
+def names(results):
+    return [(place['name'], place['country']) for place in results]
+
+def test_exact_matches_come_before_bigger_prefix_matches(gazetteer):
+    assert names(gazetteer.search('paris', limit=5)) == [
+        ('Paris', 'FR'), ('Paris', 'US'), ('Parish', 'US'), ('Parisot', 'FR'), ('Parisville', 'US')]
+    assert names(gazetteer.search('paris', limit=2)) == [('Paris', 'FR'), ('Paris', 'US')]
+
+def test_feature_classes_and_population_filter(tmp_path):
+    from gazetteer import load_geonames
+
+    path = write_geonames(tmp_path / 'cities.txt')
+    assert len(load_geonames(path, feature_classes=('P', 'A'))) == len(PLACES) - 1
+    assert names(load_geonames(path, feature_classes=('P',), min_population=1000).search('paris')) == [
+        ('Paris', 'FR'), ('Paris', 'US'), ('Parish', 'US')]
+
+def test_accents_case_and_alternate_names(gazetteer):
+    assert names(gazetteer.search('SAO  paulo')) == [('São Paulo', 'BR')]
+    assert names(gazetteer.search('são')) == [('São Paulo', 'BR')]
+    assert names(gazetteer.search('Mailand')) == [('Milano', 'IT')]
+    # A place matching through several of its names is listed once
+    assert names(gazetteer.search('mil')) == [('Milano', 'IT')]
+
+def test_country_filter_only_for_known_codes(gazetteer):
+    assert names(gazetteer.find('Paris, US'))[0] == ('Paris', 'US')
+    assert names(gazetteer.find('paris, fr')) == [('Paris', 'FR'), ('Parisot', 'FR')]
+    # TX isn't a country code of the gazetteer, the query is searched whole
+    assert names(gazetteer.find('Austin, TX')) == [('Austin, TX', 'US')]
+    # A known country without a match falls back to the whole query
+    assert gazetteer.find('Milano, BR') == []
+
+def test_geocode_coordinates_and_offline_miss():
+    from gazetteer import geocode, parse_coordinates, split_country
+
+    assert parse_coordinates('45.46, 9.19') == (45.46, 9.19)
+    assert parse_coordinates('45.46; 9.19') == (45.46, 9.19)
+    assert parse_coordinates('95, 9') is None
+    assert split_country('Paris, fr') == ('Paris', 'FR')
+    assert split_country('Paris') == ('Paris', None)
+
+    source, results = geocode('-23.5, -46.6')
+    assert source == 'coordinates' and (results[0]['latitude'], results[0]['longitude']) == (-23.5, -46.6)
+    assert geocode('Nowhere at all', upstream=False)[1] == []
+
+def test_upstream_geocoder_busy_is_a_503(monkeypatch):
+    import gazetteer
+    from app import app
+
+    def busy(query, limit=5):
+        raise gazetteer.GeocoderBusyError('The upstream geocoder is busy, try again later.')
+
+    monkeypatch.setattr(gazetteer, 'GEOCODER_URL', 'http://geocoder.invalid/search')
+    monkeypatch.setattr(gazetteer, 'search_upstream', busy)
+    response = app.test_client().get('/locate?q=Nowhere+at+all')
+    assert response.status_code == 503
+    assert 'busy' in response.get_json()['error']
@@ -0,0 +1,64 @@
+import gzip
+import json
+import zlib
+from email.utils import parsedate_to_datetime
+import pytest
+
+# Checks of the streamed, compressed GeoJSON responses (geojson_stream.py)
+# and of the /get_polygons request validation
+
+CHUNKS = [json.dumps({'feature': n}) + ', ' for n in range(250)]
+
+def test_gzip_stream_is_flushed_every_few_chunks():
+    from geojson_stream import compress_chunks
+
+    parts = list(compress_chunks(iter(CHUNKS), 'gzip', flush_every=100))
+    assert gzip.decompress(b''.join(parts)).decode() == ''.join(CHUNKS)
+
+    # Whatever was sent so far decompresses up to the last flushed chunk
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    received = b''.join(decompressor.decompress(part) for part in parts[:-1]).decode()
+    assert received == ''.join(CHUNKS[:200])
+
+def test_brotli_stream_is_flushed_every_few_chunks():
+    brotli = pytest.importorskip('brotli')
+    from geojson_stream import compress_chunks
+
+    parts = list(compress_chunks(iter(CHUNKS), 'br', flush_every=100))
+    assert brotli.decompress(b''.join(parts)).decode() == ''.join(CHUNKS)
+    decompressor = brotli.Decompressor()
+    received = b''.join(decompressor.process(part) for part in parts[:-1]).decode()
+    assert received == ''.join(CHUNKS[:200])
+
+def test_feature_collection_is_valid_json():
+    from geojson_stream import iter_feature_collection
+
+    for count in (0, 1, 3):
+        features = [{'type': 'Feature', 'properties': {'n': n}} for n in range(count)]
+        collection = json.loads(''.join(iter_feature_collection(iter(features), json.dumps)))
+        assert collection == {'type': 'FeatureCollection', 'features': features}
+
+def test_get_polygons_streams_gzipped_geojson(bench_sites):
+    from app import app
+
+    lat, lon = bench_sites[0]
+    response = app.test_client().post('/get_polygons', headers={'Accept-Encoding': 'gzip'},
+                                      json={'latitude': lat, 'longitude': lon, 'precision': 3})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    collection = json.loads(gzip.decompress(response.get_data()))
+    assert collection['type'] == 'FeatureCollection' and collection['features']
+    dates = [parsedate_to_datetime(feature['properties']['acquisition_date']) for feature in collection['features']]
+    assert dates == sorted(dates)
+
+@pytest.mark.parametrize('options', [
+    {'precision': 'x'}, {'precision': 16}, {'precision': True},
+    {'tolerance': -1}, {'tolerance': '0.1'}, {'start_date': 'yesterday'},
+])
+def test_get_polygons_rejects_bad_options(bench_sites, options):
+    from app import app
+
+    lat, lon = bench_sites[0]
+    response = app.test_client().post('/get_polygons', json=dict(options, latitude=lat, longitude=lon))
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
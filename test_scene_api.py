@@ -0,0 +1,87 @@
+import pytest
+
+# Checks of the API client pool and the rate limiter (scene_api.py), with
+# stand-in clients instead of USGS logins. The auth error tests need
+# landsatxplore for its error types.
+
+class FakeClient:
+    def __init__(self, number):
+        self.number = number
+        self.logged_out = False
+
+    def logout(self):
+        self.logged_out = True
+
+# Function to make a pool whose logins create FakeClients, returns the pool
+# and the list of clients created so far
+def make_pool(**kwargs):
+    from scene_api import APIPool
+
+    clients = []
+
+    def create():
+        clients.append(FakeClient(len(clients)))
+        return clients[-1]
+
+    return APIPool(create=create, **kwargs), clients
+
+def test_pool_reuses_logged_in_clients():
+    pool, clients = make_pool(size=2)
+    assert [pool.call(lambda client: client.number) for _ in range(3)] == [0, 0, 0]
+    assert len(clients) == 1
+    assert (pool.misses, pool.hits, pool.calls) == (1, 2, 3)
+
+def test_pool_retries_once_after_an_auth_error():
+    USGSUnauthorizedError = pytest.importorskip('landsatxplore.errors').USGSUnauthorizedError
+    pool, clients = make_pool()
+
+    def search(client):
+        if client.number == 0:
+            raise USGSUnauthorizedError('token expired')
+        return 'scenes'
+
+    assert pool.call(search) == 'scenes'
+    assert len(clients) == 2 and clients[0].logged_out
+    assert pool.auth_errors == 1
+    # Only the fresh client went back to the pool
+    assert pool.call(lambda client: client.number) == 1
+
+def test_pool_gives_up_after_the_retry():
+    USGSUnauthorizedError = pytest.importorskip('landsatxplore.errors').USGSUnauthorizedError
+    pool, clients = make_pool()
+
+    def search(client):
+        raise USGSUnauthorizedError('bad credentials')
+
+    with pytest.raises(USGSUnauthorizedError):
+        pool.call(search)
+    assert len(clients) == 2 and all(client.logged_out for client in clients)
+    assert pool.auth_errors == 2
+
+def test_pool_keeps_clients_after_other_errors():
+    pool, clients = make_pool()
+
+    def search(client):
+        raise ValueError('bad request')
+
+    with pytest.raises(ValueError):
+        pool.call(search)
+    assert pool.call(lambda client: client.number) == 0
+    assert len(clients) == 1 and not clients[0].logged_out
+
+def test_pool_refreshes_expired_clients():
+    pool, clients = make_pool(lifetime=-1)
+    pool.call(lambda client: None)
+    assert pool.call(lambda client: client.number) == 1
+    assert clients[0].logged_out
+    assert pool.refreshes == 1
+
+def test_rate_limiter_fails_fast_past_max_delay():
+    from scene_api import RateLimiter
+
+    limiter = RateLimiter(rate=0.1)
+    assert limiter.wait(max_delay=0)
+    next_time = limiter.next_time
+    # The next turn is 10 s away, the call doesn't take it
+    assert not limiter.wait(max_delay=1)
+    assert limiter.next_time == next_time
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+# Checks of the incremental per-tile sync of the scene store (scene_store.py)
+# against a stand-in API pool that records the searches
+
+class FakePool:
+    def __init__(self, scenes):
+        self.scenes = scenes
+        self.searches = []
+
+    def call(self, fn):
+        return fn(self)
+
+    # Same keywords as LocalAPI.search, answers with every scene in the range
+    def search(self, dataset, bbox, start_date, end_date, max_results):
+        self.searches.append(start_date)
+        return [dict(scene) for scene in self.scenes
+                if datetime.fromisoformat(start_date) <= scene['acquisition_date'] <= datetime.fromisoformat(end_date)]
+
+# Function to make a scene of a tile
+def make_scene(tile, path, row, acquired):
+    return {'entity_id': f'LC8{path:03d}{row:03d}{acquired:%Y%j}', 'wrs_path': path, 'wrs_row': row,
+            'acquisition_date': acquired, 'cloud_cover': 5, 'spatial_coverage': tile}
+
+def test_sync_tile_searches_from_the_newest_scene_less_the_lookback(monkeypatch, bench_sites):
+    import scene_store
+    from scene_store import SCENE_SYNC_LOOKBACK, SCENE_SYNC_START, SceneStore
+    from wrs_grid import get_wrs_grid
+
+    lat, lon = bench_sites[0]
+    path, row = get_wrs_grid().lookup(lat, lon)
+    tile = get_wrs_grid().get_tile(path, row)
+    pool = FakePool([make_scene(tile, path, row, datetime(2024, 3, 1, 10)),
+                     make_scene(tile, path, row, datetime(2024, 3, 17, 10))])
+    monkeypatch.setattr(scene_store, 'get_api_pool', lambda: pool)
+    store = SceneStore(':memory:')
+
+    assert store.sync_tile(path, row, end_date='2024-04-01') == 2
+    assert pool.searches == [SCENE_SYNC_START]
+    assert store.sync_state(path, row, 'landsat_ot_c2_l2')[0] == '2024-03-17T10:00:00'
+
+    # A neighbouring path's scene published late for an earlier day
+    pool.scenes.append(make_scene(tile, path, row, datetime(2024, 3, 9, 10)))
+    store.sync_tile(path, row, end_date='2024-04-01')
+    expected_start = (datetime(2024, 3, 17) - timedelta(days=SCENE_SYNC_LOOKBACK)).strftime('%Y-%m-%d')
+    assert pool.searches[1] == max(expected_start, SCENE_SYNC_START)
+
+    # Scenes fetched again are stored once
+    scenes = store.query(lat, lon, '2024-01-01', '2024-04-01')
+    assert [scene['acquisition_date'] for scene in scenes] == [
+        datetime(2024, 3, 1, 10), datetime(2024, 3, 9, 10), datetime(2024, 3, 17, 10)]
+
+def test_ensure_synced_skips_fresh_tiles(monkeypatch, bench_sites):
+    import scene_store
+    from scene_store import SceneStore
+    from wrs_grid import get_wrs_grid
+
+    path, row = get_wrs_grid().lookup(*bench_sites[0])
+    pool = FakePool([])
+    monkeypatch.setattr(scene_store, 'get_api_pool', lambda: pool)
+    store = SceneStore(':memory:')
+
+    store.ensure_synced(path, row)
+    store.ensure_synced(path, row)
+    assert len(pool.searches) == 1
+    assert store.stats() == {'syncs': 1, 'coalesced': 0}
+    # Synced but nothing acquired yet
+    assert store.sync_state(path, row, 'landsat_ot_c2_l2')[0] is None
@@ -0,0 +1,100 @@
+import os
+import zipfile
+import pytest
+
+# Checks of the WRS-2 download and binary cache (wrs_cache.py), all offline:
+# the "download" is a zip in the test directory.
+
+# Function to write a zip with a stand-in WRS-2 shapefile, whose members
+# only need to exist for fetch_wrs_shapefiles
+def write_dummy_zip(path, extensions=('.shp', '.shx', '.dbf', '.prj')):
+    with zipfile.ZipFile(path, 'w') as zip_file:
+        for extension in extensions:
+            zip_file.writestr(f'WRS2_descending{extension}', f'WRS2_descending{extension} content')
+    return str(path)
+
+# Function to write a zip with a real shapefile of a small synthetic grid
+def write_shapefile_zip(path, features):
+    import fiona
+    from shapely.geometry import mapping
+
+    shapefile_dir = path.parent / 'shapefile'
+    shapefile_dir.mkdir()
+    schema = {'geometry': 'Polygon', 'properties': {'PATH': 'int', 'ROW': 'int', 'MODE': 'str'}}
+    with fiona.open(shapefile_dir / 'WRS2_descending.shp', 'w', driver='ESRI Shapefile', schema=schema) as layer:
+        for geometry, wrs_path, wrs_row, mode in zip(*features):
+            layer.write({'geometry': mapping(geometry),
+                         'properties': {'PATH': int(wrs_path), 'ROW': int(wrs_row), 'MODE': str(mode)}})
+    with zipfile.ZipFile(path, 'w') as zip_file:
+        for name in os.listdir(shapefile_dir):
+            zip_file.write(shapefile_dir / name, name)
+    return str(path)
+
+def test_fetch_rejects_checksum_mismatch(tmp_path):
+    from wrs_cache import ChecksumError, fetch_wrs_shapefiles
+
+    source = write_dummy_zip(tmp_path / 'wrs2.zip')
+    with pytest.raises(ChecksumError):
+        fetch_wrs_shapefiles(source, str(tmp_path / 'cache'), '0' * 64)
+    assert not (tmp_path / 'cache').exists()
+
+def test_fetch_requires_shapefile_members(tmp_path):
+    from wrs_cache import WRS_MANIFEST, fetch_wrs_shapefiles
+
+    source = write_dummy_zip(tmp_path / 'wrs2.zip', extensions=('.shp', '.prj'))
+    with pytest.raises(ValueError, match='.shx'):
+        fetch_wrs_shapefiles(source, str(tmp_path / 'cache'), None)
+    assert os.listdir(tmp_path / 'cache') == []
+    assert not (tmp_path / 'cache' / WRS_MANIFEST).exists()
+
+def test_fetched_shapefile_is_verified(tmp_path):
+    from wrs_cache import fetch_wrs_shapefiles, file_sha256, verify_wrs_shapefiles
+
+    source = write_dummy_zip(tmp_path / 'wrs2.zip')
+    cache_dir = str(tmp_path / 'cache')
+    digest = fetch_wrs_shapefiles(source, cache_dir, file_sha256(source))
+    assert digest == file_sha256(source)
+    assert not any(name.startswith('.tmp-') for name in os.listdir(cache_dir))
+    assert verify_wrs_shapefiles(cache_dir, None) == digest
+    assert verify_wrs_shapefiles(cache_dir, digest.upper()) == digest
+    assert verify_wrs_shapefiles(cache_dir, '0' * 64) is None
+
+    # A changed member invalidates the whole set
+    with open(os.path.join(cache_dir, 'WRS2_descending.dbf'), 'ab') as f:
+        f.write(b'changed')
+    assert verify_wrs_shapefiles(cache_dir, None) is None
+
+def test_shapefile_without_manifest_is_fetched_again(tmp_path):
+    from bench_suite import synthetic_wrs_features
+    from wrs_cache import file_sha256, load_wrs_features, verify_wrs_shapefiles
+
+    features = synthetic_wrs_features(path_count=4, row_count=6)
+    source = write_shapefile_zip(tmp_path / 'wrs2.zip', features)
+    cache_dir = tmp_path / 'cache'
+    cache_dir.mkdir()
+    # Left over from an interrupted extraction
+    (cache_dir / 'WRS2_descending.shp').write_bytes(b'truncated')
+    (cache_dir / 'WRS2_descending.dbf').write_bytes(b'truncated')
+
+    geometries, paths, rows, modes = load_wrs_features(source, str(cache_dir), None)
+    assert len(geometries) == len(features[0])
+    assert sorted(zip(paths.tolist(), rows.tolist())) == sorted(zip(features[1].tolist(), features[2].tolist()))
+    assert verify_wrs_shapefiles(str(cache_dir), None) == file_sha256(source)
+
+def test_binary_cache_is_used_offline(tmp_path):
+    from bench_suite import synthetic_wrs_features
+    from wrs_cache import WRS_CACHE_VERSION, load_wrs_cache, load_wrs_features, write_wrs_cache
+
+    features = synthetic_wrs_features(path_count=4, row_count=6)
+    cache_file = str(tmp_path / f'WRS2_descending.v{WRS_CACHE_VERSION}.npz')
+    write_wrs_cache(*features, cache_file, source_sha256='ab' * 32)
+
+    # The source doesn't exist, only the cache can answer
+    missing_source = str(tmp_path / 'missing.zip')
+    geometries, paths, rows, modes = load_wrs_features(missing_source, str(tmp_path), 'AB' * 32)
+    assert len(geometries) == len(features[0])
+    assert all(a.equals(b) for a, b in zip(geometries, features[0]))
+    assert paths.tolist() == features[1].tolist() and modes.tolist() == features[3].tolist()
+
+    # A cache built from another zip isn't used
+    assert load_wrs_cache(cache_file, 'cd' * 32) is None
@@ -0,0 +1,75 @@
+import gzip
+import json
+import math
+import os
+import pytest
+
+# Checks of the slippy-map tiles of the grid (wrs_tiles.py): tile bounds, the
+# zoom clamping and what ends up in the disk cache
+
+def test_tile_bounds():
+    from wrs_tiles import tile_bounds
+
+    west, south, east, north = tile_bounds(0, 0, 0)
+    assert (west, east) == (-180, 180)
+    assert north == pytest.approx(85.0511, abs=1e-4) and south == pytest.approx(-85.0511, abs=1e-4)
+    assert tile_bounds(1, 1, 0) == pytest.approx((0, 0, 180, 85.0511), abs=1e-4)
+    # Neighbouring tiles share their edges
+    assert tile_bounds(5, 10, 12)[2] == tile_bounds(5, 11, 12)[0]
+    assert tile_bounds(5, 10, 12)[1] == tile_bounds(5, 10, 13)[3]
+
+def test_is_valid_tile():
+    from wrs_tiles import WRS_TILE_ZOOM_LIMIT, is_valid_tile
+
+    assert is_valid_tile(0, 0, 0)
+    assert is_valid_tile(3, 7, 7)
+    assert not is_valid_tile(3, 8, 0)
+    assert not is_valid_tile(3, 0, -1)
+    assert not is_valid_tile(WRS_TILE_ZOOM_LIMIT + 1, 0, 0)
+
+# Function to list the zoom levels with tiles in a cache directory
+def cached_zooms(cache_dir, mode='D'):
+    from wrs_tiles import WRS_TILE_VERSION
+
+    mode_dir = os.path.join(cache_dir, f'v{WRS_TILE_VERSION}', mode)
+    return sorted(int(zoom) for zoom in os.listdir(mode_dir)) if os.path.exists(mode_dir) else []
+
+# Function to get the x, y of the tile holding a point at zoom z
+def tile_of(lat, lon, z):
+    n = 2 ** z
+    x = int((lon + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return x, y
+
+def test_low_zoom_tiles_are_empty(tmp_path):
+    from wrs_tiles import EMPTY_TILE, WRS_TILE_MIN_ZOOM, get_tile
+
+    assert get_tile(WRS_TILE_MIN_ZOOM - 1, 0, 0, cache_dir=str(tmp_path)) == EMPTY_TILE
+    assert json.loads(gzip.decompress(EMPTY_TILE)) == {'type': 'FeatureCollection', 'features': []}
+    assert cached_zooms(str(tmp_path)) == []
+
+def test_deep_tiles_are_answered_by_their_max_zoom_parent(tmp_path, bench_sites):
+    from wrs_grid import get_wrs_grid
+    from wrs_tiles import WRS_TILE_MAX_ZOOM, get_tile
+
+    lat, lon = bench_sites[0]
+    z = WRS_TILE_MAX_ZOOM + 3
+    x, y = tile_of(lat, lon, z)
+    cache_dir = str(tmp_path)
+
+    deep = get_tile(z, x, y, cache_dir=cache_dir)
+    assert deep == get_tile(WRS_TILE_MAX_ZOOM, x >> 3, y >> 3, cache_dir=cache_dir)
+    assert cached_zooms(cache_dir) == [WRS_TILE_MAX_ZOOM]
+
+    features = json.loads(gzip.decompress(deep))['features']
+    path, row = get_wrs_grid().lookup(lat, lon)
+    assert (path, row) in {(feature['properties']['path'], feature['properties']['row']) for feature in features}
+
+def test_tile_route_rejects_missing_tiles():
+    from app import app
+
+    client = app.test_client()
+    assert client.get('/tiles/3/8/0.geojson').status_code == 404
+    response = client.get('/tiles/0/0/0.geojson')
+    assert response.status_code == 200
+    assert json.loads(response.get_data())['features'] == []
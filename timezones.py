@@ -0,0 +1,57 @@
+import os
+import threading
+from functools import lru_cache
+from metrics import timed
+
+# Which finder to use: 'full' is TimezoneFinder with exact polygon tests,
+# 'light' is TimezoneFinderL which only uses its precomputed shortcuts and is
+# much faster but can be wrong close to timezone borders
+TIMEZONE_FINDER = os.environ.get('TIMEZONE_FINDER', 'full')
+
+# Coordinates are rounded to this many decimals before the lookup so nearby
+# requests share one cache entry (2 decimals is roughly 1 km)
+TIMEZONE_PRECISION = int(os.environ.get('TIMEZONE_PRECISION', '2'))
+TIMEZONE_CACHE_SIZE = int(os.environ.get('TIMEZONE_CACHE_SIZE', '65536'))
+
+_finder = None
+_finder_lock = threading.Lock()
+
+# Function to create the process-wide timezone finder on first use
+def get_timezone_finder():
+    global _finder
+    if _finder is not None:
+        return _finder
+
+    with _finder_lock:
+        if _finder is None:
+            from timezonefinder import TimezoneFinder, TimezoneFinderL
+
+            finder_class = TimezoneFinderL if TIMEZONE_FINDER == 'light' else TimezoneFinder
+            try:
+                # Keep the polygon data in memory instead of reading the files on every lookup
+                _finder = finder_class(in_memory=True)
+            except TypeError:
+                # Versions without the in_memory option
+                _finder = finder_class()
+    return _finder
+
+# Only cache misses get here, so the stage times the actual polygon lookup
+@lru_cache(maxsize=TIMEZONE_CACHE_SIZE)
+@timed('timezone_lookup')
+def _timezone_name_at(lat, lon):
+    timezone_str = get_timezone_finder().timezone_at(lat=lat, lng=lon)
+    # Open ocean without an Etc/GMT zone in the finder's data
+    return timezone_str or 'UTC'
+
+# Function to get the timezone name at a location, memoized per rounded coordinate
+def get_timezone_name(lat, lon):
+    return _timezone_name_at(round(float(lat), TIMEZONE_PRECISION), round(float(lon), TIMEZONE_PRECISION))
+
+# Function to get a pytz timezone by name
+def get_timezone_by_name(name):
+    import pytz
+    return pytz.timezone(name)
+
+# Function to get the pytz timezone at a location
+def get_timezone(lat, lon):
+    return get_timezone_by_name(get_timezone_name(lat, lon))
@@ -0,0 +1,209 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+import numpy as np
+from metrics import stage, timed
+
+# Location of the WRS-2 descending shapefile and where to get it from.
+# WRS_SOURCE may also point at a local copy of the zip, in which case no
+# network access is needed at all.
+WRS_CACHE_DIR = os.environ.get('WRS_CACHE_DIR', 'landsat-path-row')
+WRS_SHAPEFILE = os.path.join(WRS_CACHE_DIR, 'WRS2_descending.shp')
+WRS_URL = "https://d9-wret.s3.us-west-2.amazonaws.com/assets/palladium/production/s3fs-public/atoms/files/WRS2_descending_0.zip"
+WRS_SOURCE = os.environ.get('WRS_SOURCE', WRS_URL)
+
+# Expected SHA-256 of the source zip, unset means "record it but don't check"
+WRS_SHA256 = os.environ.get('WRS_SHA256') or None
+
+# Written next to the extracted shapefile with the digest of the zip and of
+# every member. It goes in last, a shapefile without a matching one is fetched again.
+WRS_MANIFEST = 'WRS2_descending.sha256.json'
+
+# Bump when the layout of the binary cache changes
+WRS_CACHE_VERSION = 1
+WRS_CACHE_FILE = os.path.join(WRS_CACHE_DIR, f'WRS2_descending.v{WRS_CACHE_VERSION}.npz')
+
+# Shapefile members we need out of the zip, the first three must be there
+SHAPEFILE_EXTENSIONS = ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+
+# Raised when the downloaded or supplied zip doesn't match the expected checksum
+class ChecksumError(ValueError):
+    pass
+
+# Function to compute the SHA-256 of a file without reading it all at once
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Function to write a file next to its destination and move it into place,
+# so readers never see a half-written file
+def _atomic_write(destination, write):
+    directory = os.path.dirname(destination) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            write(tmp_file)
+        os.replace(tmp_path, destination)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+# Function to download (or copy) the WRS-2 zip, verify it and extract the
+# shapefile into cache_dir. source can be a URL or a local file path. The
+# members are extracted into a staging directory first and only moved into
+# place once all of them are there, the manifest last.
+def fetch_wrs_shapefiles(source=WRS_SOURCE, cache_dir=WRS_CACHE_DIR, sha256=WRS_SHA256):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        zip_path = os.path.join(tmp_dir, 'wrs2.zip')
+        with stage('wrs_download'):
+            if os.path.exists(source):
+                shutil.copyfile(source, zip_path)
+            else:
+                import urllib.request
+                with urllib.request.urlopen(source) as r, open(zip_path, 'wb') as f:
+                    shutil.copyfileobj(r, f)
+
+        digest = file_sha256(zip_path)
+        if sha256 is not None and digest != sha256.lower():
+            raise ChecksumError(f"WRS-2 zip from {source} has SHA-256 {digest}, expected {sha256}")
+
+        os.makedirs(cache_dir, exist_ok=True)
+        staging_dir = tempfile.mkdtemp(dir=cache_dir, prefix='.tmp-')
+        try:
+            files = {}
+            with zipfile.ZipFile(zip_path) as zip_file:
+                for name in zip_file.namelist():
+                    base_name = os.path.basename(name)
+                    if not base_name.lower().endswith(SHAPEFILE_EXTENSIONS):
+                        continue
+                    staged = os.path.join(staging_dir, base_name)
+                    with zip_file.open(name) as member, open(staged, 'wb') as f:
+                        shutil.copyfileobj(member, f)
+                    files[base_name] = file_sha256(staged)
+            extensions = {os.path.splitext(name)[1].lower() for name in files}
+            for extension in SHAPEFILE_EXTENSIONS[:3]:
+                if extension not in extensions:
+                    raise ValueError(f"WRS-2 zip from {source} has no {extension} file")
+
+            manifest = os.path.join(cache_dir, WRS_MANIFEST)
+            if os.path.exists(manifest):
+                os.unlink(manifest)
+            for base_name in files:
+                os.replace(os.path.join(staging_dir, base_name), os.path.join(cache_dir, base_name))
+            _atomic_write(manifest, lambda f: f.write(json.dumps({'source_sha256': digest, 'files': files}, indent=1).encode()))
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+    return digest
+
+# Function to check the extracted shapefile against its manifest. Returns the
+# SHA-256 of the zip it came from, or None if the manifest is missing, a file
+# is missing or changed, or the zip isn't the expected one.
+def verify_wrs_shapefiles(cache_dir=WRS_CACHE_DIR, sha256=WRS_SHA256):
+    try:
+        with open(os.path.join(cache_dir, WRS_MANIFEST)) as f:
+            manifest = json.load(f)
+        source_sha256, files = manifest['source_sha256'], manifest['files']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if sha256 is not None and source_sha256 != sha256.lower():
+        return None
+    if 'WRS2_descending.shp' not in files or 'WRS2_descending.dbf' not in files:
+        return None
+    for name, file_digest in files.items():
+        path = os.path.join(cache_dir, name)
+        if not os.path.exists(path) or file_sha256(path) != file_digest:
+            return None
+    return source_sha256
+
+# Function to read every feature of the shapefile into flat arrays
+@timed('wrs_shapefile_read')
+def read_shapefile(shapefile=WRS_SHAPEFILE):
+    import fiona
+    from shapely.geometry import shape
+
+    geometries, paths, rows, modes = [], [], [], []
+    with fiona.open(shapefile) as shapefile_layer:
+        for feature in shapefile_layer:
+            properties = feature['properties']
+            geometries.append(shape(feature['geometry']))
+            paths.append(properties['PATH'])
+            rows.append(properties['ROW'])
+            modes.append(properties['MODE'])
+    return geometries, paths, rows, modes
+
+# Function to convert the shapefile into the compact binary cache
+def build_wrs_cache(shapefile=WRS_SHAPEFILE, cache_file=WRS_CACHE_FILE, source_sha256=''):
+    write_wrs_cache(*read_shapefile(shapefile), cache_file, source_sha256)
+
+# Function to write features to the binary cache: all geometries as one WKB
+# buffer plus offsets, and the attributes as arrays
+def write_wrs_cache(geometries, paths, rows, modes, cache_file=WRS_CACHE_FILE, source_sha256=''):
+    import shapely
+
+    wkb = shapely.to_wkb(np.asarray(geometries, dtype=object))
+    offsets = np.zeros(len(wkb) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in wkb])
+
+    arrays = {
+        'version': np.array(WRS_CACHE_VERSION),
+        'source_sha256': np.array(source_sha256),
+        'wkb': np.frombuffer(b''.join(wkb), dtype=np.uint8),
+        'offsets': offsets,
+        'path': np.asarray(paths, dtype=np.int16),
+        'row': np.asarray(rows, dtype=np.int16),
+        'mode': np.asarray(modes, dtype='U1'),
+    }
+    _atomic_write(cache_file, lambda f: np.savez(f, **arrays))
+
+# Function to read the binary cache back, returns None if it's missing,
+# from an older cache version or built from a zip with another checksum
+@timed('wrs_cache_load')
+def load_wrs_cache(cache_file=WRS_CACHE_FILE, sha256=WRS_SHA256):
+    import shapely
+
+    if not os.path.exists(cache_file):
+        return None
+    with np.load(cache_file) as data:
+        if int(data['version']) != WRS_CACHE_VERSION:
+            return None
+        if sha256 is not None and str(data['source_sha256']) != sha256.lower():
+            return None
+        buffer = data['wkb'].tobytes()
+        offsets = data['offsets']
+        wkb = [buffer[start:end] for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+        geometries = shapely.from_wkb(wkb)
+        return geometries, data['path'], data['row'], data['mode']
+
+# Function to get the WRS-2 features, using the binary cache when possible and
+# only touching the shapefile (or the network) the first time
+def load_wrs_features(source=WRS_SOURCE, cache_dir=WRS_CACHE_DIR, sha256=WRS_SHA256):
+    cache_file = os.path.join(cache_dir, f'WRS2_descending.v{WRS_CACHE_VERSION}.npz')
+    features = load_wrs_cache(cache_file, sha256)
+    if features is not None:
+        return features
+
+    # Extract again unless the shapefile is complete and from the expected zip
+    digest = verify_wrs_shapefiles(cache_dir, sha256)
+    if digest is None:
+        digest = fetch_wrs_shapefiles(source, cache_dir, sha256)
+    build_wrs_cache(os.path.join(cache_dir, 'WRS2_descending.shp'), cache_file, digest)
+    return load_wrs_cache(cache_file, sha256)
+
+# Build the cache ahead of time, e.g. while creating a container image
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch the WRS-2 shapefile and build its binary cache.")
+    parser.add_argument('--source', default=WRS_SOURCE, help="URL or local path of the WRS-2 zip")
+    parser.add_argument('--cache-dir', default=WRS_CACHE_DIR)
+    parser.add_argument('--sha256', default=WRS_SHA256, help="expected SHA-256 of the zip")
+    args = parser.parse_args()
+
+    geometries, paths, rows, modes = load_wrs_features(args.source, args.cache_dir, args.sha256)
+    print(f"WRS-2 cache ready in {args.cache_dir}: {len(geometries)} tiles.")
@@ -0,0 +1,263 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from metrics import stage
+from wrs_cache import WRS_SHAPEFILE, load_wrs_features, read_shapefile
+
+# Descending (daytime) and ascending (night) tiles
+WRS_MODES = ('D', 'A')
+
+# Path/row value returned by the batch lookup for points outside every tile
+NO_TILE = -1
+
+# Cell size in degrees of the point lookup cache (0.01 is roughly 1 km) and how
+# many cells it keeps before evicting the least recently used ones
+TILE_CACHE_RESOLUTION = float(os.environ.get('TILE_CACHE_RESOLUTION', 0.01))
+TILE_CACHE_SIZE = int(os.environ.get('TILE_CACHE_SIZE', 100000))
+
+# Mean Earth radius in kilometres, for the distance to the scene centers
+EARTH_RADIUS_KM = 6371.0088
+
+# Cache value of cells that aren't entirely inside one tile
+_STRADDLING = object()
+
+# Spatial index over the WRS-2 tiles of a single mode ('D' or 'A')
+class WRSGrid:
+    def __init__(self, geometries, paths, rows, mode='D'):
+        import shapely
+
+        self.mode = mode
+        self.geometries = np.asarray(geometries, dtype=object)
+        self.paths = np.asarray(paths, dtype=np.int16)
+        self.rows = np.asarray(rows, dtype=np.int16)
+
+        # Prepared geometries make the repeated point-in-polygon tests cheap,
+        # the STRtree narrows each lookup down to the few tiles whose
+        # bounding box contains the point
+        with stage('wrs_index_build'):
+            shapely.prepare(self.geometries)
+            self.tree = shapely.STRtree(self.geometries)
+
+        # Scene centers, for the distance of a point to each covering scene
+        centers = shapely.get_coordinates(shapely.centroid(self.geometries))
+        self.center_lons = centers[:, 0].tolist()
+        self.center_lats = centers[:, 1].tolist()
+
+        # (path, row) -> position in the arrays above
+        self.tile_index = {}
+        for index, key in enumerate(zip(self.paths.tolist(), self.rows.tolist())):
+            self.tile_index.setdefault(key, index)
+
+    # Build the grid from feature arrays, keeping only features of the given mode
+    @classmethod
+    def from_features(cls, geometries, paths, rows, modes, mode='D'):
+        keep = np.asarray(modes) == mode
+        return cls(np.asarray(geometries, dtype=object)[keep], np.asarray(paths)[keep],
+                   np.asarray(rows)[keep], mode)
+
+    # Build the grid straight from a shapefile, bypassing the binary cache
+    @classmethod
+    def from_shapefile(cls, shapefile=WRS_SHAPEFILE, mode='D'):
+        return cls.from_features(*read_shapefile(shapefile), mode)
+
+    def __len__(self):
+        return len(self.geometries)
+
+    # Return the polygon of a tile, or None if the grid has no such path/row
+    def get_tile(self, path, row):
+        index = self.tile_index.get((int(path), int(row)))
+        return None if index is None else self.geometries[index]
+
+    # Return the indices of every tile containing the point, in shapefile order
+    def covering(self, lat, lon):
+        import shapely
+
+        with stage('wrs_lookup'):
+            hits = self.tree.query(shapely.Point(lon, lat), predicate='within')
+        return tuple(sorted(hits.tolist()))
+
+    # Return the (path, row) of the tile containing the point, or (None, None)
+    def lookup(self, lat, lon):
+        hits = self.covering(lat, lon)
+        if not hits:
+            return None, None
+        # Tiles overlap, keep the first one in shapefile order like the old scan did
+        return self.tile_at(hits[0])
+
+    def tile_at(self, index):
+        return int(self.paths[index]), int(self.rows[index])
+
+    # Return (path, row, distance_km) of every tile containing the point,
+    # nearest scene center first. Neighbouring scenes overlap, so a point is
+    # usually covered by two or three of them.
+    def lookup_all(self, lat, lon):
+        return self.describe(self.covering(lat, lon), lat, lon)
+
+    # Function to turn tile indices into (path, row, distance_km) tuples for a point
+    def describe(self, indices, lat, lon):
+        tiles = []
+        lat_radians = math.radians(lat)
+        for index in indices:
+            # Haversine distance to the scene center
+            center_lat = math.radians(self.center_lats[index])
+            a = (math.sin((center_lat - lat_radians) / 2) ** 2 + math.cos(lat_radians) * math.cos(center_lat)
+                 * math.sin(math.radians(self.center_lons[index] - lon) / 2) ** 2)
+            distance = 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+            tiles.append(self.tile_at(index) + (distance,))
+        tiles.sort(key=lambda tile: tile[2])
+        return tiles
+
+    # Return (indices, aoi_fractions, tile_fractions, parts) for the tiles
+    # intersecting an area: the share of the area inside each tile, the share
+    # of each tile inside the area and the part of the area inside each tile.
+    # The STRtree pre-filters on bounding boxes and the area is prepared for
+    # the exact tests; tiles containing the whole area skip the overlay.
+    def intersect(self, area):
+        import shapely
+
+        shapely.prepare(area)
+        with stage('wrs_intersect'):
+            indices = np.sort(self.tree.query(area, predicate='intersects'))
+            containing = np.isin(indices, self.tree.query(area, predicate='within'))
+            parts = np.empty(len(indices), dtype=object)
+            parts[containing] = area
+            parts[~containing] = shapely.intersection(self.geometries[indices[~containing]], area)
+        area_size = area.area
+        part_sizes = shapely.area(parts)
+        aoi_fractions = np.minimum(1.0, part_sizes / area_size)
+        tile_fractions = np.minimum(1.0, part_sizes / shapely.area(self.geometries[indices]))
+        return indices, aoi_fractions, tile_fractions, parts
+
+    # Return the indices of the tiles covering every point of the box, or
+    # None if some tile covers only part of it (the box straddles a boundary)
+    def uniform_cover(self, box):
+        hits = self.tree.query(box, predicate='intersects')
+        for index in hits.tolist():
+            if not self.geometries[index].contains(box):
+                return None
+        return tuple(sorted(hits.tolist()))
+
+    # Vectorized lookup for arrays of coordinates, returns (paths, rows) arrays
+    # with NO_TILE where a point falls outside every tile
+    def lookup_many(self, lats, lons):
+        import shapely
+
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        points = shapely.points(lons, lats)
+        with stage('wrs_lookup_batch'):
+            point_index, tile_index = self.tree.query(points, predicate='within')
+
+        # Same first-in-shapefile-order rule as lookup() for overlapping tiles
+        first_tile = np.full(len(points), len(self), dtype=np.intp)
+        np.minimum.at(first_tile, point_index, tile_index)
+        found = first_tile < len(self)
+
+        paths = np.full(len(points), NO_TILE, dtype=np.int16)
+        rows = np.full(len(points), NO_TILE, dtype=np.int16)
+        paths[found] = self.paths[first_tile[found]]
+        rows[found] = self.rows[first_tile[found]]
+        return paths, rows
+
+# LRU cache in front of the WRSGrid lookups keyed by coordinates snapped to a
+# grid of `resolution` degree cells. A cell is only answered from the cache
+# when the whole cell is covered by the same set of tiles; cells straddling
+# a tile boundary are remembered as such and always get the exact lookup.
+class TileLookupCache:
+    def __init__(self, grid, resolution=TILE_CACHE_RESOLUTION, max_entries=TILE_CACHE_SIZE):
+        self.grid = grid
+        self.resolution = resolution
+        self.max_entries = max_entries
+        self.cells = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.straddling = 0
+
+    def cell_key(self, lat, lon):
+        return math.floor(lat / self.resolution), math.floor(lon / self.resolution)
+
+    # Return the indices of the tiles containing the point, like WRSGrid.covering
+    def covering(self, lat, lon):
+        key = self.cell_key(lat, lon)
+        with self.lock:
+            value = self.cells.get(key)
+            if value is not None:
+                self.cells.move_to_end(key)
+        if value is _STRADDLING:
+            self.straddling += 1
+            return self.grid.covering(lat, lon)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        hits = self.grid.covering(lat, lon)
+        value = self._check_cell(key, hits)
+        with self.lock:
+            self.cells[key] = value
+            if len(self.cells) > self.max_entries:
+                self.cells.popitem(last=False)
+        return hits
+
+    def _check_cell(self, key, hits):
+        import shapely
+
+        if not hits:
+            return _STRADDLING  # Outside the grid, always do the exact lookup
+        lat_index, lon_index = key
+        box = shapely.box(lon_index * self.resolution, lat_index * self.resolution,
+                          (lon_index + 1) * self.resolution, (lat_index + 1) * self.resolution)
+        if self.grid.uniform_cover(box) == hits:
+            return hits
+        return _STRADDLING
+
+    # Same as WRSGrid.lookup
+    def lookup(self, lat, lon):
+        hits = self.covering(lat, lon)
+        return self.grid.tile_at(hits[0]) if hits else (None, None)
+
+    # Same as WRSGrid.lookup_all
+    def lookup_all(self, lat, lon):
+        return self.grid.describe(self.covering(lat, lon), lat, lon)
+
+    def stats(self):
+        with self.lock:
+            size = len(self.cells)
+        return {'size': size, 'resolution': self.resolution, 'hits': self.hits,
+                'misses': self.misses, 'straddling': self.straddling}
+
+_grids = {}
+_grids_lock = threading.Lock()
+_tile_caches = {}
+
+# Function to get the process-wide grid for a mode, building it on first use.
+# Raises ValueError for anything but 'D' or 'A'.
+def get_wrs_grid(mode='D'):
+    grid = _grids.get(mode)
+    if grid is not None:
+        return grid
+    if mode not in WRS_MODES:
+        raise ValueError(f"mode must be one of {list(WRS_MODES)}.")
+
+    with _grids_lock:
+        grid = _grids.get(mode)
+        if grid is None:
+            # Served from the local binary cache, the network is only used
+            # the very first time when nothing has been cached yet
+            grid = WRSGrid.from_features(*load_wrs_features(), mode)
+            _grids[mode] = grid
+    return grid
+
+# Function to get the process-wide quantized lookup cache for a mode
+def get_tile_cache(mode='D'):
+    cache = _tile_caches.get(mode)
+    if cache is not None:
+        return cache
+
+    grid = get_wrs_grid(mode)
+    with _grids_lock:
+        cache = _tile_caches.setdefault(mode, TileLookupCache(grid))
+    return cache
@@ -0,0 +1,137 @@
+import argparse
+import gzip
+import json
+import math
+import os
+import threading
+import numpy as np
+from LandsatCalc import get_cycle_day_array
+from metrics import timed
+from wrs_cache import WRS_CACHE_DIR, _atomic_write
+from wrs_grid import get_wrs_grid
+
+# Slippy-map GeoJSON tiles of the WRS-2 grid for the landsat.html map. Each
+# zoom level uses geometry simplified to about a pixel at that zoom, and
+# every tile is rendered once and then served from a gzipped file on disk.
+
+# Bump when the tile content changes, and delete the cache directory when the
+# WRS-2 shapefile changes
+WRS_TILE_VERSION = 1
+WRS_TILE_CACHE_DIR = os.environ.get('WRS_TILE_CACHE_DIR', os.path.join(WRS_CACHE_DIR, 'tiles'))
+
+# Below WRS_TILE_MIN_ZOOM a tile would hold thousands of scenes, so those
+# tiles are empty. Above WRS_TILE_MAX_ZOOM the geometry no longer changes, and
+# deeper tiles are answered with their WRS_TILE_MAX_ZOOM parent. Only the
+# zooms in between are cached on disk, which bounds the cache size.
+WRS_TILE_MIN_ZOOM = int(os.environ.get('WRS_TILE_MIN_ZOOM', 3))
+WRS_TILE_MAX_ZOOM = int(os.environ.get('WRS_TILE_MAX_ZOOM', 8))
+WRS_TILE_ZOOM_LIMIT = 22
+
+EMPTY_TILE = gzip.compress(b'{"type":"FeatureCollection","features":[]}', compresslevel=9, mtime=0)
+
+# Tiles never change for a given version, let browsers and CDNs keep them
+WRS_TILE_MAX_AGE = int(os.environ.get('WRS_TILE_MAX_AGE', 30 * 24 * 3600))
+
+# Function to get the lon/lat bounds (west, south, east, north) of a
+# Web Mercator tile
+def tile_bounds(z, x, y):
+    n = 2 ** z
+    west = x / n * 360 - 180
+    east = (x + 1) / n * 360 - 180
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return west, south, east, north
+
+# Function to check z/x/y address an existing tile
+def is_valid_tile(z, x, y):
+    return 0 <= z <= WRS_TILE_ZOOM_LIMIT and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+# Simplified copies of the grid geometry per (mode, zoom)
+_simplified = {}
+_simplified_lock = threading.Lock()
+
+# Function to get the grid geometry simplified for a zoom level: Douglas-Peucker
+# with a one pixel tolerance, coordinates rounded to the decimal below it
+def get_simplified_geometries(zoom, mode='D'):
+    key = (mode, zoom)
+    geometries = _simplified.get(key)
+    if geometries is not None:
+        return geometries
+
+    import shapely
+
+    with _simplified_lock:
+        geometries = _simplified.get(key)
+        if geometries is None:
+            tolerance = 360 / (256 * 2 ** zoom)
+            geometries = shapely.simplify(get_wrs_grid(mode).geometries, tolerance, preserve_topology=True)
+            geometries = shapely.set_precision(geometries, 10 ** math.floor(math.log10(tolerance)))
+            _simplified[key] = geometries
+    return geometries
+
+# Function to render a tile as a GeoJSON FeatureCollection (bytes). Scenes
+# crossing the tile edge are sent whole, the client dedupes them by path/row.
+@timed('wrs_tile_render')
+def render_tile(z, x, y, mode='D'):
+    import shapely
+
+    features = []
+    if z >= WRS_TILE_MIN_ZOOM:
+        grid = get_wrs_grid(mode)
+        geometries = get_simplified_geometries(min(z, WRS_TILE_MAX_ZOOM), mode)
+        indices = np.sort(grid.tree.query(shapely.box(*tile_bounds(z, x, y)), predicate='intersects'))
+        paths = grid.paths[indices].tolist()
+        cycle_days = get_cycle_day_array(paths).tolist()
+        for index, path, row, cycle_day in zip(indices.tolist(), paths, grid.rows[indices].tolist(), cycle_days):
+            features.append({
+                'type': 'Feature',
+                'geometry': json.loads(shapely.to_geojson(geometries[index])),
+                'properties': {'path': path, 'row': row, 'cycle_day': cycle_day},
+            })
+    return json.dumps({'type': 'FeatureCollection', 'features': features}, separators=(',', ':')).encode()
+
+# Function to get the cache file of a tile
+def tile_path(z, x, y, mode='D', cache_dir=WRS_TILE_CACHE_DIR):
+    return os.path.join(cache_dir, f'v{WRS_TILE_VERSION}', mode, str(z), str(x), f'{y}.geojson.gz')
+
+# Function to get a tile as gzipped GeoJSON, rendering and caching it on disk
+# the first time
+def get_tile(z, x, y, mode='D', cache_dir=WRS_TILE_CACHE_DIR):
+    if z < WRS_TILE_MIN_ZOOM:
+        return EMPTY_TILE
+    if z > WRS_TILE_MAX_ZOOM:
+        # The parent holds every scene touching this tile, already simplified enough
+        shift = z - WRS_TILE_MAX_ZOOM
+        z, x, y = WRS_TILE_MAX_ZOOM, x >> shift, y >> shift
+
+    path = tile_path(z, x, y, mode, cache_dir)
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    data = gzip.compress(render_tile(z, x, y, mode), compresslevel=9, mtime=0)
+    _atomic_write(path, lambda f: f.write(data))
+    return data
+
+# Function to pre-generate every cached tile of a range of zoom levels
+def pregenerate_tiles(min_zoom=WRS_TILE_MIN_ZOOM, max_zoom=WRS_TILE_MAX_ZOOM, mode='D', cache_dir=WRS_TILE_CACHE_DIR):
+    count = 0
+    for z in range(max(min_zoom, WRS_TILE_MIN_ZOOM), min(max_zoom, WRS_TILE_MAX_ZOOM) + 1):
+        for x in range(2 ** z):
+            for y in range(2 ** z):
+                get_tile(z, x, y, mode, cache_dir)
+                count += 1
+    return count
+
+# Pre-generate the tile cache, e.g. while building a container image
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-generate the WRS-2 grid map tiles.")
+    parser.add_argument('--min-zoom', type=int, default=WRS_TILE_MIN_ZOOM)
+    parser.add_argument('--max-zoom', type=int, default=WRS_TILE_MAX_ZOOM)
+    parser.add_argument('--mode', default='D', choices=['D', 'A'])
+    parser.add_argument('--cache-dir', default=WRS_TILE_CACHE_DIR)
+    args = parser.parse_args()
+
+    count = pregenerate_tiles(args.min_zoom, args.max_zoom, args.mode, args.cache_dir)
+    print(f"{count} tiles written to {args.cache_dir}.")
@@ -0,0 +1,37 @@
+import gc
+import os
+
+# Modes whose WRS-2 index is built before the workers fork
+PRELOAD_MODES = tuple(os.environ.get('PRELOAD_MODES', 'D').split(','))
+
+# Function to load everything read-only the requests need: the WRS-2 index
+# and its lookup cache, the memory-mapped overpass table, the gazetteer and
+# the timezone finder (for tiles missing from the table). Done in the
+# gunicorn master with preload_app, the workers share these pages
+# copy-on-write. Nothing holding a socket, a thread or an SQLite connection
+# is created here, those are made lazily in each worker.
+def preload_state(modes=PRELOAD_MODES):
+    from gazetteer import get_gazetteer
+    from overpass_table import get_overpass_table
+    from timezones import get_timezone_finder
+    from wrs_grid import get_tile_cache, get_wrs_grid
+
+    for mode in modes:
+        get_wrs_grid(mode)
+        get_tile_cache(mode)
+    get_gazetteer()
+    if get_overpass_table() is None:
+        get_timezone_finder()
+
+# WSGI application factory
+def create_app(preload=True):
+    from app import app
+
+    if preload:
+        preload_state()
+        # Keep the garbage collector from touching (and so copying) the
+        # preloaded objects in every worker
+        gc.freeze()
+    return app
+
+application = create_app()